@@ -1,5 +1,34 @@
-from ._version import get_versions
+# the models are imported eagerly: defining them registers Absori and
+# Integrate_Absori with astromodels, which load_model needs to read a saved
+# model. Their heavy dependencies (numba kernels, astropy.io.fits, jax) are
+# imported where they are used
 from .xray.absorption import Absori, Integrate_Absori
 
-__version__ = get_versions()['version']
-del get_versions
+# warmup (which imports the numba kernels) and the version (which can call
+# git) are loaded on first access
+_lazy_attributes = {"warmup": "bb_astromodels.utils.warmup"}
+
+__all__ = ["Absori", "Integrate_Absori", "warmup"]
+
+
+def __getattr__(name):
+    if name == "__version__":
+        from ._version import get_versions
+
+        value = get_versions()['version']
+
+    elif name in _lazy_attributes:
+        import importlib
+
+        value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes) | {"__version__"})
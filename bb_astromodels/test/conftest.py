@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_dir(tmp_path_factory):
+    """
+    Keep the atomic data bundle and the autotune choices of the tests out of
+    the user cache directory
+    """
+    old = os.environ.get("BB_ASTROMODELS_CACHE")
+    path = tmp_path_factory.mktemp("cache")
+    os.environ["BB_ASTROMODELS_CACHE"] = str(path)
+
+    yield path
+
+    if old is None:
+        del os.environ["BB_ASTROMODELS_CACHE"]
+    else:
+        os.environ["BB_ASTROMODELS_CACHE"] = old
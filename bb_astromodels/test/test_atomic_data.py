@@ -0,0 +1,119 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from bb_astromodels.utils.atomic_data import load_bundle
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """
+    A source file, a loader that counts its calls and an empty cache directory
+    """
+    monkeypatch.setenv("BB_ASTROMODELS_CACHE", str(tmp_path/"cache"))
+
+    path = tmp_path/"source.dat"
+    path.write_text("1 2 3")
+
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return dict(a=np.loadtxt(path), b=np.arange(6).reshape(2, 3))
+
+    return str(path), loader, calls
+
+
+def bundle_path(tmp_path, file_name):
+    return os.path.join(str(tmp_path/"cache"), "test", file_name)
+
+
+def check_arrays(arrays):
+    assert np.array_equal(arrays["a"], [1., 2., 3.])
+    assert np.array_equal(arrays["b"], np.arange(6).reshape(2, 3))
+
+
+def test_load_bundle(source):
+    path, loader, calls = source
+
+    check_arrays(load_bundle("test", 1, [path], loader))
+
+    arrays = load_bundle("test", 1, [path], loader)
+    check_arrays(arrays)
+    assert isinstance(arrays["a"], np.memmap)
+    assert not arrays["a"].flags.writeable
+    assert len(calls) == 1
+
+
+def test_load_bundle_changed_source(source):
+    path, loader, calls = source
+
+    load_bundle("test", 1, [path], loader)
+
+    with open(path, "w") as f:
+        f.write("4 5 6")
+
+    arrays = load_bundle("test", 1, [path], loader)
+    assert np.array_equal(arrays["a"], [4., 5., 6.])
+    assert len(calls) == 2
+
+
+def test_load_bundle_changed_version(source):
+    path, loader, calls = source
+
+    load_bundle("test", 1, [path], loader)
+    check_arrays(load_bundle("test", 2, [path], loader))
+    assert len(calls) == 2
+
+
+def test_load_bundle_changed_manifest(source, tmp_path):
+    path, loader, calls = source
+
+    load_bundle("test", 1, [path], loader)
+
+    manifest_path = bundle_path(tmp_path, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["sources"]["source.dat"] = "0"*64
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    check_arrays(load_bundle("test", 1, [path], loader))
+    assert len(calls) == 2
+
+
+def test_load_bundle_corrupted_array(source, tmp_path):
+    path, loader, calls = source
+
+    load_bundle("test", 1, [path], loader)
+
+    # same shape and dtype, other content
+    np.save(bundle_path(tmp_path, "a.npy"), np.zeros(3))
+
+    check_arrays(load_bundle("test", 1, [path], loader))
+    assert len(calls) == 2
+
+    # truncated file
+    with open(bundle_path(tmp_path, "b.npy"), "wb") as f:
+        f.write(b"\x93NUMPY")
+
+    check_arrays(load_bundle("test", 1, [path], loader))
+    assert len(calls) == 3
+
+
+def test_load_bundle_unwritable_cache_dir(source, tmp_path, monkeypatch):
+    path, loader, calls = source
+
+    # the cache directory can not be created below a file (this also works
+    # as root, unlike a read-only directory)
+    (tmp_path/"file").write_text("")
+    monkeypatch.setenv("BB_ASTROMODELS_CACHE", str(tmp_path/"file"/"cache"))
+
+    arrays = load_bundle("test", 1, [path], loader)
+    check_arrays(arrays)
+    assert not isinstance(arrays["a"], np.memmap)
+
+    load_bundle("test", 1, [path], loader)
+    assert len(calls) == 2
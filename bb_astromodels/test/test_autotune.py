@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+from bb_astromodels.utils.autotune import Autotuner
+
+x = np.geomspace(0.1, 20, 300)
+
+
+def auto_model(model_class):
+    model = model_class()
+    model.backend = "auto"
+    model.redshift.value = 0.5
+    model.reset_autotune()
+
+    return model
+
+
+def test_autotuner_persistence(tmp_path, monkeypatch):
+    monkeypatch.setenv("BB_ASTROMODELS_CACHE", str(tmp_path))
+
+    autotuner = Autotuner("test.json")
+    assert autotuner.get("a|1") is None
+
+    strategy = autotuner.tune("a|1", dict(fast=lambda: None,
+                                          slow=lambda: time.sleep(1e-3)))
+    assert strategy == "fast"
+    autotuner.tune("b|1", dict(only=lambda: None))
+
+    # a new instance reads the choices from the file
+    reloaded = Autotuner("test.json")
+    assert reloaded.get("a|1") == "fast"
+    assert reloaded.choices == autotuner.choices
+    assert set(reloaded.choices["a|1"]["timings"]) == {"fast", "slow"}
+
+    reloaded.clear("a|")
+    assert Autotuner("test.json").choices.keys() == {"b|1"}
+
+
+def test_autotuner_unwritable_cache_dir(tmp_path, monkeypatch):
+    (tmp_path/"file").write_text("")
+    monkeypatch.setenv("BB_ASTROMODELS_CACHE", str(tmp_path/"file"/"cache"))
+
+    # the choices are kept in memory
+    autotuner = Autotuner("test.json")
+    autotuner.tune("a|1", dict(only=lambda: None))
+    assert autotuner.get("a|1") == "only"
+
+
+@pytest.mark.parametrize("model_class", [Absori, Integrate_Absori])
+def test_reset_autotune(model_class):
+    model = auto_model(model_class)
+    reference = model(x)
+
+    choices = model.autotune_choices
+    assert len(choices) == 1
+
+    # the choice is reused
+    assert np.allclose(model(x), reference, rtol=1e-12, atol=0)
+    assert model.autotune_choices == choices
+
+    model.reset_autotune()
+    assert model.autotune_choices == {}
+
+
+def test_no_design_matrix_with_free_redshift():
+    model = auto_model(Absori)
+    model(x)
+    choice, = model.autotune_choices.values()
+    assert "numpy_design_matrix" in choice["timings"]
+
+    model.reset_autotune()
+    model.redshift.free = True
+    model(x)
+    choice, = model.autotune_choices.values()
+    assert "numpy_design_matrix" not in choice["timings"]
+    assert model._design_matrix is None
+
+
+@pytest.mark.parametrize("model_class", [Absori, Integrate_Absori])
+@pytest.mark.parametrize("setting,value", [("dtype", "float32"),
+                                           ("sigma_tolerance", 5e-2),
+                                           ("memory_budget", 100000)])
+def test_no_numba_with_settings(model_class, setting, value):
+    model = auto_model(model_class)
+    model(x)
+    choice, = model.autotune_choices.values()
+    assert "numba" in choice["timings"]
+
+    # the choice of the default settings is not reused
+    setattr(model, setting, value)
+    result = model(x)
+    assert len(model.autotune_choices) == 2
+
+    key, = [key for key in model.autotune_choices if str(value) in key]
+    assert "numba" not in model.autotune_choices[key]["timings"]
+
+    # the result of the configured numpy path
+    numpy_model = model_class()
+    numpy_model.redshift.value = 0.5
+    setattr(numpy_model, setting, value)
+    assert np.allclose(result, numpy_model(x), rtol=1e-5, atol=1e-12)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+x = np.geomspace(0.01, 100, 2000)
+
+absori_parameters = [dict(),
+                     dict(temp=1e5, xi=10., gamma=1.5),
+                     dict(temp=3e6, xi=500., abundance=0.5, fe_abundance=-0.3, NH=3.),
+                     dict(redshift=0.7, xi=0.3)]
+
+integrate_absori_parameters = [dict(redshift=1.0),
+                               dict(redshift=0.3, n0=1e-3, delta=1., temp=1e6, xi=50.)]
+
+cases = ([(Absori, p) for p in absori_parameters] +
+         [(Integrate_Absori, p) for p in integrate_absori_parameters])
+
+
+def evaluate(model_class, parameters, backend):
+    model = model_class()
+    model.backend = backend
+    for name, value in parameters.items():
+        model.parameters[name].value = value
+
+    return model(x)
+
+
+@pytest.mark.parametrize("model_class,parameters", cases)
+def test_numba_backend(model_class, parameters):
+    reference = evaluate(model_class, parameters, "numpy")
+
+    assert np.allclose(evaluate(model_class, parameters, "numba"), reference,
+                       rtol=1e-12, atol=1e-14)
+
+
+@pytest.mark.parametrize("model_class,parameters", cases)
+def test_jax_backend(model_class, parameters):
+    jax = pytest.importorskip("jax")
+
+    reference = evaluate(model_class, parameters, "numpy")
+
+    assert np.allclose(evaluate(model_class, parameters, "jax"), reference,
+                       rtol=1e-10, atol=1e-14)
+
+    # double precision is scoped to the model calls
+    assert not jax.config.jax_enable_x64
+
+
+@pytest.mark.parametrize("model_class,values", [
+    (Absori, [2., 0.3, 3e5, 30., 2.2, 0.4, -0.3]),
+    (Integrate_Absori, [1e-3, 0.5, 1.03, 3e5, 30., 2.2, 0.4, -0.3])])
+def test_jax_function_gradient(model_class, values):
+    jax = pytest.importorskip("jax")
+
+    from bb_astromodels.utils.jax_functions import enable_x64
+
+    model = model_class()
+    if model_class is Integrate_Absori:
+        # the shells of the redshift in values
+        function = model.get_jax_function(nz=int(values[2]/0.02))
+    else:
+        function = model.get_jax_function()
+
+    _, jac = model.evaluate_with_jacobian(x, *values)
+
+    # gradient of the sum of the transmission with respect to all parameters
+    with enable_x64():
+        grad = jax.grad(lambda *p: function(x, *p).sum(),
+                        argnums=tuple(range(len(values))))(*values)
+
+    assert np.allclose(grad, jac.sum(axis=1), rtol=1e-8, atol=1e-12)
+    assert not jax.config.jax_enable_x64
+
+    # in the jax default precision (float32)
+    assert np.allclose(function(x, *values), model.evaluate(x, *values),
+                       rtol=0, atol=1e-5)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+x = np.geomspace(0.1, 20, 300)
+
+rng = np.random.default_rng(1)
+P = 7
+
+# redshift and delta take repeated values, so the groups of the batch
+# have more than one row
+absori_batch = [10**rng.uniform(-1, 1, P),
+                rng.choice([0., 0.3, 1.2], P),
+                10**rng.uniform(4, 7, P),
+                10**rng.uniform(-0.5, 2.5, P),
+                rng.uniform(1.5, 2.5, P),
+                rng.uniform(-0.5, 0.5, P),
+                rng.uniform(-0.5, 0.5, P)]
+
+integrate_absori_batch = [10**rng.uniform(-5, -3, P),
+                          rng.choice([0., 1.], P),
+                          rng.choice([0.3, 1.03], P)] + absori_batch[2:]
+
+cases = [(Absori, absori_batch), (Integrate_Absori, integrate_absori_batch)]
+
+
+def evaluate_loop(model, batch):
+    return np.array([model.evaluate(x, *values) for values in zip(*batch)])
+
+
+@pytest.mark.parametrize("model_class,batch", cases)
+def test_evaluate_batch(model_class, batch):
+    model = model_class()
+    res = model.evaluate_batch(x, *batch)
+
+    assert res.shape == (P, len(x))
+    assert np.allclose(res, evaluate_loop(model, batch), rtol=1e-13, atol=1e-15)
+
+
+@pytest.mark.parametrize("model_class,batch", cases)
+def test_evaluate_batch_scalars(model_class, batch):
+    model = model_class()
+
+    # the first parameter and the gamma as scalars for all sets
+    k = len(batch)-3
+    scalar_batch = list(batch)
+    scalar_batch[0] = batch[0][0]
+    scalar_batch[k] = 2.
+
+    res = model.evaluate_batch(x, *scalar_batch)
+    full_batch = [np.full(P, p) if np.ndim(p) == 0 else p for p in scalar_batch]
+
+    assert res.shape == (P, len(x))
+    assert np.allclose(res, evaluate_loop(model, full_batch), rtol=1e-13, atol=1e-15)
+
+    # a batch of scalars is one set
+    values = [p[0] for p in full_batch]
+    assert np.allclose(model.evaluate_batch(x, *values),
+                       model.evaluate(x, *values)[np.newaxis], rtol=1e-13, atol=1e-15)
+
+
+@pytest.mark.parametrize("model_class,batch", cases)
+def test_evaluate_batch_float32(model_class, batch):
+    model = model_class()
+    model.dtype = "float32"
+    res = model.evaluate_batch(x, *batch)
+
+    assert res.dtype == np.float64
+    assert np.allclose(res, evaluate_loop(model, batch), rtol=0, atol=1e-6)
+    # the float32 error of the transmission
+    assert np.allclose(res, model_class().evaluate_batch(x, *batch), rtol=0, atol=1e-6)
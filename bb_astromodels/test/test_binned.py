@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+edges = np.geomspace(0.1, 10, 65)
+
+cases = [(Absori, [1., 0., 1e4, 1., 2., 0., 0.]),
+         (Absori, [3., 0.3, 3e5, 30., 2.2, 0.4, -0.3]),
+         (Integrate_Absori, [1e-4, 0., 1.03, 1e4, 1., 2., 0., 0.])]
+
+
+def trapezoid_means(model, values, n=4001):
+    """
+    Mean transmission in every bin from a fine trapezoid rule
+    """
+    means = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        e = np.linspace(lo, hi, n)
+        res = model.evaluate(e, *values)
+        means.append(np.sum(0.5*(res[1:]+res[:-1])*np.diff(e))/(hi-lo))
+
+    return np.array(means)
+
+
+@pytest.mark.parametrize("model_class,values", cases)
+def test_evaluate_binned(model_class, values):
+    model = model_class()
+
+    res = model.evaluate_binned(edges, values)
+    reference = trapezoid_means(model, values)
+
+    assert res.shape == (len(edges)-1,)
+    assert np.max(np.abs(res-reference)) < 1e-5
+
+
+def test_bin_quadrature():
+    model = Absori()
+    breakpoints = model._calc_breakpoints(model.get_parameter_vector())
+    nodes, weights, bins = model._get_bin_quadrature(edges, breakpoints)
+
+    # nodes inside their bins, the weights of every bin add up to 1
+    assert np.all((nodes > edges[bins]) & (nodes < edges[bins+1]))
+    assert np.allclose(np.bincount(bins, weights), 1, rtol=1e-13, atol=0)
+
+    # the bins are split at every breakpoint inside the grid
+    n_inner = np.sum((breakpoints > edges[0]) & (breakpoints < edges[-1]))
+    assert len(nodes) == model._n_bin_nodes*(len(edges)-1+n_inner)
@@ -0,0 +1,71 @@
+import numpy as np
+
+from bb_astromodels.utils.cache import array_fingerprint, cache_array_method
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    @cache_array_method(maxsize=1)
+    def double(self, x, factor=2):
+        self.calls += 1
+        return factor*x
+
+    @cache_array_method()
+    def nothing(self, x):
+        self.calls += 1
+        return None
+
+
+def test_cache_array_method_maxsize():
+    c = Counter()
+    x = np.arange(10.)
+
+    assert np.array_equal(c.double(x), 2*x)
+    assert np.array_equal(c.double(x.copy()), 2*x)
+    assert c.calls == 1
+
+    # new arguments evict the only entry
+    assert np.array_equal(c.double(x, factor=3), 3*x)
+    assert np.array_equal(c.double(x), 2*x)
+    assert c.calls == 3
+
+    info = Counter.double.cache_info(c)
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 3, 2, 1)
+
+
+def test_cache_array_method_caches_none():
+    c = Counter()
+    x = np.arange(10.)
+
+    assert c.nothing(x) is None
+    assert c.nothing(x) is None
+    assert c.calls == 1
+    assert Counter.nothing.cache_info(c).hits == 1
+
+
+def test_cache_array_method_per_instance():
+    a, b = Counter(), Counter()
+    x = np.arange(10.)
+
+    a.double(x)
+    b.double(x)
+    assert a.calls == b.calls == 1
+
+    Counter.double.cache_clear(a)
+    a.double(x)
+    assert a.calls == 2
+
+
+def test_cache_array_method_crc32_collision():
+    c = Counter()
+    # two arrays with the same crc32
+    x = np.array([1961874467380731689, 1705255274863801913])
+    y = np.array([1844080747955635306, 4313609687960306154])
+    assert array_fingerprint(x) == array_fingerprint(y)
+
+    assert np.array_equal(c.double(x), 2*x)
+    assert np.array_equal(c.double(y), 2*y)
+    assert c.calls == 2
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+x = np.geomspace(0.1, 20, 300)
+
+
+def fresh(model_class, **kwargs):
+    """
+    A new model with the parameter values, nothing cached yet
+    """
+    model = model_class()
+    if model_class is Integrate_Absori:
+        model.redshift.value = 0.5
+    for name, value in kwargs.items():
+        if name in model.parameters:
+            model.parameters[name].value = value
+        else:
+            # dtype, sigma_tolerance
+            setattr(model, name, value)
+
+    return model(x)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "numba"])
+def test_unfix_redshift(backend):
+    model = Absori()
+    model.backend = backend
+    model(x)
+
+    model.redshift.free = True
+    model.redshift.value = 0.8
+    assert np.allclose(model(x), fresh(Absori, redshift=0.8), rtol=1e-12, atol=0)
+
+    model.redshift.fix = True
+    model.redshift.value = 0.2
+    assert np.allclose(model(x), fresh(Absori, redshift=0.2), rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("model_class", [Absori, Integrate_Absori])
+@pytest.mark.parametrize("name", ["abundance", "fe_abundance"])
+def test_free_abundance(model_class, name):
+    model = model_class()
+    if model_class is Integrate_Absori:
+        model.redshift.value = 0.5
+    model(x)
+
+    model.parameters[name].free = True
+    for value in (0.5, -0.3):
+        model.parameters[name].value = value
+        assert np.allclose(model(x), fresh(model_class, **{name: value}),
+                           rtol=1e-10, atol=1e-300)
+
+
+def test_dtype_change():
+    model = Absori()
+    model.temp.value = 3e5
+    reference = model(x)
+
+    model.dtype = "float32"
+    assert np.array_equal(model(x), fresh(Absori, temp=3e5, dtype="float32"))
+    assert np.array_equal(model.fast_evaluate(x, model.get_parameter_vector()),
+                          model(x))
+
+    model.dtype = "float64"
+    assert np.array_equal(model(x), reference)
+
+
+def test_sigma_tolerance_change():
+    model = Absori()
+    reference = model(x)
+
+    model.sigma_tolerance = 1e-3
+    assert np.array_equal(model(x), fresh(Absori, sigma_tolerance=1e-3))
+    assert not np.array_equal(model(x), reference)
+
+    model.sigma_tolerance = None
+    assert np.array_equal(model(x), reference)
@@ -0,0 +1,31 @@
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+x = np.geomspace(0.1, 20, 300)
+
+
+@pytest.mark.parametrize("model_class", [Absori, Integrate_Absori])
+@pytest.mark.parametrize("backend", ["numpy", "numba", "jax", "auto"])
+def test_copy_and_pickle(model_class, backend):
+    if backend == "jax":
+        pytest.importorskip("jax")
+
+    model = model_class()
+    model.backend = backend
+    model.redshift.value = 0.5
+    # fills the caches (and the jax data)
+    reference = model(x)
+
+    for other in (copy.deepcopy(model), pickle.loads(pickle.dumps(model))):
+        assert other.backend == backend
+        assert np.array_equal(other(x), reference)
+
+        # the copy is independent of the model
+        other.xi.value = 10.
+        assert not np.array_equal(other(x), reference)
+        assert np.array_equal(model(x), reference)
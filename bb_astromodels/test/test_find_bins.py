@@ -0,0 +1,35 @@
+import numpy as np
+
+from bb_astromodels import Absori
+
+
+def searchsorted_bins(base_energy, e):
+    return np.clip(np.searchsorted(base_energy, e, side="right")-1,
+                   0, len(base_energy)-2)
+
+
+def test_find_bins_log_grid():
+    model = Absori()
+    base_energy = model._base_energy
+
+    # the O(1) lookup is used for the base energy grid
+    assert model._log_grid is not None
+
+    # the grid energies, their neighbouring floats and values outside the grid
+    e = np.concatenate([base_energy,
+                        np.nextafter(base_energy, 0),
+                        np.nextafter(base_energy, np.inf),
+                        np.geomspace(base_energy[0], base_energy[-1], 10000),
+                        [0., base_energy[0]/2, 2*base_energy[-1], np.inf]])
+
+    assert np.array_equal(model._find_bins(e), searchsorted_bins(base_energy, e))
+
+
+def test_find_bins_without_log_grid():
+    model = Absori()
+    e = np.geomspace(1, 1e6, 1000)
+    reference = model._find_bins(e)
+
+    # fallback for grids that are not uniform in log(e)
+    model._log_grid = None
+    assert np.array_equal(model._find_bins(e), reference)
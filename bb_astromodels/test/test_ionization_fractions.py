@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori
+
+
+@pytest.mark.parametrize("chunk_size", [5, 10000])
+def test_ionization_fractions(chunk_size):
+    model = Absori()
+
+    # 3x4 grid, the last chunk of 5 points is ragged
+    temp, xi = np.meshgrid(np.geomspace(1e4, 1e7, 3), np.geomspace(0.3, 300, 4),
+                           indexing="ij")
+    gamma = np.array([[1.5], [2.], [2.5]])
+
+    fractions = model.ionization_fractions(temp, xi, gamma, chunk_size=chunk_size)
+
+    n_elements = len(model._atomicnumber)
+    assert fractions.shape == (3, 4, 26, n_elements)
+
+    for i in range(3):
+        for j in range(4):
+            num = model._calc_num(temp[i, j], xi[i, j], gamma[i, 0])
+
+            # ion k is in stage _ion_stage[k] of element _ion_element[k]
+            assert np.allclose(fractions[i, j, model._ion_stage, model._ion_element],
+                               num, rtol=1e-13, atol=0)
+
+    # no ions above the atomic number
+    for element, z in enumerate(model._atomicnumber):
+        assert np.all(fractions[..., z:, element] == 0)
+        assert np.all(fractions[..., :z, element] > 0)
+
+    # without the fully stripped ion the fractions add up to at most 1
+    assert np.all(fractions.sum(axis=-2) <= 1+1e-12)
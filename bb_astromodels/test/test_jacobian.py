@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+x = np.geomspace(0.01, 50, 400)
+
+cases = [(Absori, [2., 0.3, 3e5, 30., 2.2, 0.4, -0.3]),
+         (Absori, [2., 0.0, 1e4, 0.5, 1.7, 0., 0.]),
+         # the number of redshift shells int(redshift/0.02) is the same for all
+         # steps of the finite differences
+         (Integrate_Absori, [1e-3, 0.5, 1.03, 3e5, 30., 2.2, 0.4, -0.3])]
+
+
+@pytest.mark.parametrize("model_class,values", cases)
+def test_jacobian_finite_differences(model_class, values):
+    model = model_class()
+
+    res, jac = model.evaluate_with_jacobian(x, *values)
+
+    assert jac.shape == (len(values), len(x))
+    assert np.allclose(res, model.evaluate(x, *values), rtol=1e-14, atol=1e-15)
+
+    for k, name in enumerate(model.parameters):
+        # central differences
+        h = 1e-6*max(abs(values[k]), 1e-2)
+        plus, minus = list(values), list(values)
+        plus[k] += h
+        minus[k] -= h
+
+        fd = (model.evaluate(x, *plus)-model.evaluate(x, *minus))/(2*h)
+
+        assert np.max(np.abs(jac[k]-fd)) <= 1e-6*np.max(np.abs(fd)), name
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori, Integrate_Absori
+
+x = np.geomspace(0.1, 20, 1000)
+
+
+def model_with(model_class, free_abundances):
+    model = model_class()
+    model.redshift.value = 0.5
+    model.xi.value = 30.
+    model.abundance.value = 0.3
+    model.fe_abundance.value = -0.2
+    model.abundance.free = free_abundances
+    model.fe_abundance.free = free_abundances
+
+    return model
+
+
+@pytest.mark.parametrize("model_class", [Absori, Integrate_Absori])
+@pytest.mark.parametrize("free_abundances", [True, False])
+def test_chunked_evaluation(model_class, free_abundances):
+    reference = model_with(model_class, free_abundances)(x)
+
+    model = model_with(model_class, free_abundances)
+    # chunks of 137 energies, the last one is ragged
+    model.memory_budget = 137*model._bytes_per_energy
+
+    chunks = model._chunks(len(x))
+    assert len(chunks) == 8
+    assert chunks[-1].stop-chunks[-1].start == len(x)-7*137
+
+    assert np.allclose(model(x), reference, rtol=1e-12, atol=1e-15)
+
+    # the chunks do not fill the caches per energy grid
+    model.xi.value = 10.
+    model.memory_budget = None
+    unchunked = model(x)
+    model.memory_budget = 137*model._bytes_per_energy
+    assert np.allclose(model(x), unchunked, rtol=1e-12, atol=1e-15)
+
+
+def test_memory_budget_fits():
+    model = Absori()
+    model.memory_budget = len(x)*model._bytes_per_energy
+
+    # the grid fits in the budget, no chunks
+    assert model._chunks(len(x)) is None
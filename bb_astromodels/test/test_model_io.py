@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+from astromodels import Model, PointSource, Powerlaw
+
+import bb_astromodels
+from bb_astromodels import Absori, Integrate_Absori
+
+# read back in a fresh interpreter, where only the package import can have
+# registered the models with astromodels
+load = """
+import sys
+import astromodels
+import bb_astromodels
+
+model = astromodels.load_model(sys.argv[1])
+print(model.src.spectrum.main.shape.expression)
+print(model.src.spectrum.main.shape.NH_2.value)
+"""
+
+
+def test_load_saved_model(tmp_path):
+    shape = Powerlaw()*Absori()*Integrate_Absori()
+    shape.NH_2.value = 3.
+    path = str(tmp_path/"model.yml")
+    Model(PointSource("src", 0., 0., spectral_shape=shape)).save(path)
+
+    package_dir = os.path.dirname(os.path.dirname(bb_astromodels.__file__))
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join([package_dir, os.environ.get("PYTHONPATH", "")]))
+
+    out = subprocess.run([sys.executable, "-c", load, path], check=True, env=env,
+                         capture_output=True, text=True).stdout.split("\n")
+
+    assert out[0] == shape.expression
+    assert float(out[1]) == 3.
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from bb_astromodels import Absori
+
+
+@pytest.mark.parametrize("tolerance", [1e-4, 1e-3, 1e-2])
+def test_decimation_error_bound(tolerance):
+    model = Absori()
+    model.sigma_tolerance = tolerance
+    info = model.sigma_table_info
+
+    assert info["tolerance"] == tolerance
+    assert info["max_rel_error"] <= tolerance
+    assert info["n_energies"] <= info["n_base_energies"]
+
+    # interpolation of the decimated table at all base energies
+    base_energy = model._base_energy
+    sigma = model._sigma
+    interpolated = np.stack([np.interp(base_energy, model._table_energy,
+                                       model._table_sigma[:, j])
+                             for j in range(sigma.shape[1])], axis=1)
+
+    assert np.all(np.abs(interpolated-sigma) <= tolerance*np.abs(sigma))
+
+
+@pytest.mark.parametrize("tolerance", [1e-4, 1e-2])
+def test_decimation_opacity_error(tolerance):
+    model = Absori()
+    # energies inside of the table
+    x = np.geomspace(model._base_energy[0], model._base_energy[-1], 3000)[1:-1]/1000
+    # redshift, temp, xi, gamma, abundance, fe_abundance
+    values = [0., 3e5, 30., 2., 0., 0.]
+    opacity = model._calc_opacity(x, *values)
+
+    model.sigma_tolerance = tolerance
+    decimated_opacity = model._calc_opacity(x, *values)
+
+    # the opacity is a positive sum of the sigmas
+    assert np.all(np.abs(decimated_opacity-opacity) <= tolerance*opacity*(1+1e-9))
+
+
+def test_full_table():
+    model = Absori()
+    model.sigma_tolerance = 1e-3
+    model.sigma_tolerance = None
+    info = model.sigma_table_info
+
+    assert info["n_energies"] == info["n_base_energies"]
+    assert info["max_rel_error"] == 0
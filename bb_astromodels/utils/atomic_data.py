@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from bb_astromodels.utils.data_files import _get_cache_path
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_registry = {}
+
+
+def get_shared_data(key, loader):
+    """
+    Process-wide registry of read-only data shared by all model instances.
+    loader() is only called for the first request of a key and has to return a
+    dict. Its arrays are flagged as non-writeable, so no instance can change
+    the shared data.
+
+    :param key: hashable key of the data
+    :param loader: callable that loads the data
+    :return: dict with the shared data
+    """
+    data = _registry.get(key)
+
+    if data is None:
+
+        with _lock:
+
+            # an other thread could have loaded it in the meantime
+            data = _registry.get(key)
+
+            if data is None:
+
+                data = loader()
+
+                for value in data.values():
+                    if isinstance(value, np.ndarray):
+                        value.flags.writeable = False
+
+                _registry[key] = data
+
+    return data
+
+
+def clear_shared_data():
+    """
+    Remove all data from the registry. Existing instances keep their references,
+    new instances load the data again.
+    """
+    with _lock:
+        _registry.clear()
+
+
+def _file_checksum(path):
+    """
+    sha256 of a file
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _array_checksum(array):
+    """
+    sha256 of the data of an array
+    """
+    return hashlib.sha256(np.ascontiguousarray(array)).hexdigest()
+
+
+def load_bundle(name, version, sources, loader):
+    """
+    Load precompiled arrays from a bundle of .npy files in the cache directory.
+    The arrays are memory-mapped read-only, so all processes share the pages
+    through the page cache. The bundle stores its version, the checksums of
+    the source files and the shape, dtype and checksum of every array. If it
+    is missing, has an other version or source checksums, or an array file
+    is broken or changed, the arrays are loaded from the sources with
+    loader() and the bundle is (re)built.
+
+    :param name: name of the bundle (directory in the cache directory)
+    :param version: version of the bundle format and post-processing
+    :param sources: paths of the source files the arrays are built from
+    :param loader: callable that returns a dict name -> array built from the sources
+    :return: dict name -> array
+    """
+    manifest = dict(version=version,
+                    sources={os.path.basename(path): _file_checksum(path)
+                             for path in sources})
+
+    try:
+        bundle_dir = _get_cache_path(name)
+
+        with open(os.path.join(bundle_dir, "manifest.json")) as f:
+            stored = json.load(f)
+
+        if {key: stored[key] for key in manifest} != manifest:
+            raise ValueError("outdated bundle")
+
+        arrays = {}
+        for key, (shape, dtype, checksum) in stored["arrays"].items():
+            arrays[key] = np.load(os.path.join(bundle_dir, f"{key}.npy"), mmap_mode="r")
+
+            if (list(arrays[key].shape) != shape or arrays[key].dtype.str != dtype or
+                    _array_checksum(arrays[key]) != checksum):
+                raise ValueError(f"broken array {key}")
+
+        return arrays
+
+    except (OSError, ValueError, KeyError, TypeError) as e:
+
+        log.info(f"Building the {name} bundle from the source files ({e})")
+
+    arrays = loader()
+
+    try:
+        bundle_dir = _get_cache_path(name)
+        _write_bundle(bundle_dir, manifest, arrays)
+
+        return {key: np.load(os.path.join(bundle_dir, f"{key}.npy"), mmap_mode="r")
+                for key in arrays}
+
+    except OSError as e:
+        # read-only cache directory, use the arrays from the sources
+        log.warning(f"Could not write the {name} bundle: {e}")
+
+        return arrays
+
+
+def _write_bundle(bundle_dir, manifest, arrays):
+    """
+    Write the arrays and the manifest of a bundle. Every file is written to a
+    temporary file first and the manifest last, so readers never see a half
+    written bundle.
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    manifest = dict(manifest, arrays={})
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        manifest["arrays"][key] = (list(array.shape), array.dtype.str,
+                                   _array_checksum(array))
+
+        tmp_path = os.path.join(bundle_dir, f"{key}.npy.{os.getpid()}.tmp")
+        np.save(tmp_path, array, allow_pickle=False)
+        # np.save adds the .npy suffix
+        os.replace(f"{tmp_path}.npy", os.path.join(bundle_dir, f"{key}.npy"))
+
+    tmp_path = os.path.join(bundle_dir, f"manifest.json.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(bundle_dir, "manifest.json"))
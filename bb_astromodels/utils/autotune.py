@@ -0,0 +1,106 @@
+import json
+import os
+import timeit
+
+from bb_astromodels.utils.data_files import _get_cache_path
+
+
+class Autotuner(object):
+    """
+    Benchmarks the evaluation strategies of a model once per key (e.g. grid size
+    and pattern of free parameters) and remembers the fastest one. The choices
+    are persisted as json, so they survive between sessions.
+    """
+
+    def __init__(self, file_name="autotune.json"):
+        self._file_name = file_name
+        self._choices = None
+
+    @property
+    def choices(self):
+        """
+        All choices, key -> {"strategy": fastest strategy, "timings": {strategy: seconds}}
+        """
+        self._load()
+
+        return {key: dict(choice) for key, choice in self._choices.items()}
+
+    def get(self, key):
+        """
+        The chosen strategy for the key or None if it was not tuned yet
+        """
+        self._load()
+
+        choice = self._choices.get(key)
+
+        if choice is None:
+            return None
+
+        return choice["strategy"]
+
+    def tune(self, key, candidates, repeat=3):
+        """
+        Benchmark the candidates and store the fastest.
+
+        :param key: key of the choice
+        :param candidates: dict strategy -> callable that runs the benchmark
+        :param repeat: number of timed runs per candidate (after one warm up run)
+        :returns: the fastest strategy
+        """
+        timings = {}
+        for strategy, run in candidates.items():
+            # warm up (jit compilation, precalculated matrices)
+            run()
+            timings[strategy] = min(timeit.repeat(run, number=1, repeat=repeat))
+
+        strategy = min(timings, key=timings.get)
+
+        self._load()
+        self._choices[key] = dict(strategy=strategy, timings=timings)
+        self._save()
+
+        return strategy
+
+    def clear(self, prefix=""):
+        """
+        Remove the choices with keys that start with prefix (all by default)
+        """
+        self._load()
+
+        for key in [key for key in self._choices if key.startswith(prefix)]:
+            del self._choices[key]
+
+        self._save()
+
+    def _load(self):
+        if self._choices is not None:
+            return
+
+        self._choices = {}
+
+        try:
+            with open(_get_cache_path(self._file_name)) as f:
+                self._choices = json.load(f)
+
+        except (OSError, ValueError):
+            # no or broken file, start from scratch
+            pass
+
+    def _save(self):
+        try:
+            path = _get_cache_path(self._file_name)
+
+            # write to a temporary file first, so an other process never reads
+            # a half written file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._choices, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
+
+        except OSError:
+            # read-only cache dir, keep the choices in memory only
+            pass
+
+
+# shared by all models
+autotuner = Autotuner()
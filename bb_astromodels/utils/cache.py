@@ -1,26 +1,179 @@
-from functools import lru_cache, wraps
+import hashlib
+import sys
+import zlib
+from collections import OrderedDict, namedtuple
+from functools import wraps
 import numpy as np
 
-def cache_array_method(*args, **kwargs):
+
+def array_fingerprint(np_array):
+    """
+    Cheap hashable fingerprint of a numpy array (crc32 of the
+    buffer, shape and dtype). Used as key for the stage caches, which hold
+    the last few inputs of one calculation.
+    """
+    np_array = np.ascontiguousarray(np_array)
+    return zlib.crc32(np_array.data), np_array.shape, np_array.dtype.str
+
+
+def array_digest(np_array):
+    """
+    Hashable digest of a numpy array (128 bit blake2b of the buffer, shape
+    and dtype). Slower than array_fingerprint, but a collision is not a
+    practical concern, so it is used as key for caches with many entries.
     """
-    LRU cache implementation for methods whose FIRST parameter is a numpy array
-    modified from: https://gist.github.com/Susensio/61f4fee01150caaac1e10fc5f005eb75
+    np_array = np.ascontiguousarray(np_array)
+    return (hashlib.blake2b(np_array.data, digest_size=16).digest(),
+            np_array.shape, np_array.dtype.str)
+
+
+def cache_stage(stage, maxsize=1):
+    """
+    Per instance LRU cache for the stages of a calculation. Remembers the arguments
+    and the results of the last maxsize calls of the stage in s._stages[stage] and
+    only reruns it if the arguments are new. The arguments of a stage are exactly
+    the inputs it depends on, numpy arrays are keyed by their fingerprint.
+    The size can be changed per instance in s._stage_sizes[stage].
+    The caches live on the instance, so they never keep an instance alive.
+    The results are shared between calls, so they must not be changed in place.
     """
 
     def decorator(function):
         @wraps(function)
-        def wrapper(s, np_array, *args, **kwargs):
-            hashable_array = tuple(np_array)
-            return cached_wrapper(s, hashable_array, *args, **kwargs)
-
-        @lru_cache(*args, **kwargs)
-        def cached_wrapper(s, hashable_array, *args, **kwargs):
-            array = np.array(hashable_array)
-            return function(s, array, *args, **kwargs)
-
-        # copy lru_cache attributes over too
-        wrapper.cache_info = cached_wrapper.cache_info
-        wrapper.cache_clear = cached_wrapper.cache_clear
+        def wrapper(s, *args):
+            key = tuple(array_fingerprint(arg) if isinstance(arg, np.ndarray)
+                        else arg for arg in args)
+
+            cache = s._stages.get(stage)
+            if cache is None:
+                cache = s._stages[stage] = OrderedDict()
+
+            result = cache.get(key)
+            if result is not None:
+                cache.move_to_end(key)
+                return result
+
+            result = function(s, *args)
+
+            cache[key] = result
+            while len(cache) > s._stage_sizes.get(stage, maxsize):
+                cache.popitem(last=False)
+
+            return result
+
+        wrapper.stage = stage
+        wrapper.maxsize = maxsize
+        return wrapper
+
+    return decorator
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "currsize",
+                                     "nbytes", "maxsize", "maxbytes"])
+
+# returned by ArrayCache.get on a miss, so None can be cached as a result
+_missing = object()
+
+
+def _nbytes(obj):
+    """
+    Memory used by a cached result (arrays or tuples/lists of arrays)
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sum(_nbytes(o) for o in obj)
+    return sys.getsizeof(obj)
+
+
+class ArrayCache(object):
+    """
+    LRU cache with a memory budget in bytes and optionally a maximal number of
+    entries. Keeps track of hits, misses and evictions.
+    """
+
+    def __init__(self, maxbytes, maxsize=None):
+        self._maxbytes = maxbytes
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """
+        The cached value or _missing
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self._misses += 1
+            return _missing
+        self._hits += 1
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        nbytes = _nbytes(value)
+        if nbytes > self._maxbytes:
+            # would evict everything else and still not fit
+            return
+        self._data[key] = (value, nbytes)
+        self._nbytes += nbytes
+        while (self._nbytes > self._maxbytes or
+               (self._maxsize is not None and len(self._data) > self._maxsize)):
+            _, (_, old_nbytes) = self._data.popitem(last=False)
+            self._nbytes -= old_nbytes
+            self._evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self._nbytes = 0
+
+    def info(self):
+        return CacheInfo(self._hits, self._misses, self._evictions,
+                         len(self._data), self._nbytes, self._maxsize,
+                         self._maxbytes)
+
+
+def cache_array_method(maxsize=128, maxbytes=64*1024**2):
+    """
+    LRU cache for methods with numpy array arguments. All array arguments are
+    keyed by their digest (see array_digest), so neither the key nor the
+    arrays are copied. The cache is per instance and limited to
+    maxsize results (None for no limit, like lru_cache) and maxbytes of cached
+    results, the least recently used results are evicted first.
+    Use function.cache_info(instance) and function.cache_clear(instance) for the
+    stats and to clear the cache.
+    """
+
+    def decorator(function):
+        name = "_array_cache_%s" % function.__name__
+
+        def get_cache(s):
+            cache = vars(s).get(name)
+            if cache is None:
+                cache = ArrayCache(maxbytes, maxsize)
+                setattr(s, name, cache)
+            return cache
+
+        @wraps(function)
+        def wrapper(s, *args, **kwargs):
+            key = tuple(array_digest(arg) if isinstance(arg, np.ndarray)
+                        else arg for arg in args)
+            if kwargs:
+                key += tuple((k, array_digest(v) if isinstance(v, np.ndarray)
+                              else v) for k, v in sorted(kwargs.items()))
+
+            cache = get_cache(s)
+            result = cache.get(key)
+            if result is _missing:
+                result = function(s, *args, **kwargs)
+                cache.put(key, result)
+            return result
+
+        wrapper.cache_info = lambda s: get_cache(s).info()
+        wrapper.cache_clear = lambda s: get_cache(s).clear()
         return wrapper
 
     return decorator
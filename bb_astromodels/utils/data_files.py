@@ -1,5 +1,6 @@
-import pkg_resources
 import os
+import pathlib
+from importlib import resources
 
 
 def _get_data_file_path(data_file):
@@ -13,13 +14,40 @@ def _get_data_file_path(data_file):
 
     try:
 
-        file_path = pkg_resources.resource_filename("bb_astromodels", 'data/%s' % data_file)
+        file_path = resources.files("bb_astromodels").joinpath("data").joinpath(data_file)
 
-    except KeyError:
+    except AttributeError:
+
+        # python < 3.9, the data files are installed with the package
+        file_path = pathlib.Path(__file__).parents[1].joinpath("data", data_file)
+
+    if not file_path.is_file():
 
         raise IOError("Could not read or find data file %s. Try reinstalling astromodels. If this does not fix your "
                       "problem, open an issue on github." % (data_file))
 
-    else:
+    return os.path.abspath(str(file_path))
+
+
+def _get_cache_path(file_name):
+    """
+    Returns the absolute path of a file in the cache directory of bb_astromodels.
+    This is $BB_ASTROMODELS_CACHE if set, otherwise bb_astromodels in the user
+    cache directory ($XDG_CACHE_HOME or ~/.cache). The directory is created
+    if it does not exist.
+
+    :param file_name: name of the file in the cache directory
+    :return: absolute path of the file
+    """
+
+    cache_dir = os.environ.get("BB_ASTROMODELS_CACHE")
+
+    if cache_dir is None:
+
+        cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME",
+                                                os.path.join(os.path.expanduser("~"), ".cache")),
+                                 "bb_astromodels")
+
+    os.makedirs(cache_dir, exist_ok=True)
 
-        return os.path.abspath(file_path)
+    return os.path.abspath(os.path.join(cache_dir, file_name))
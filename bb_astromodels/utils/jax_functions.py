@@ -0,0 +1,147 @@
+from functools import partial
+
+import jax
+import jax.numpy as jnp
+
+
+def enable_x64():
+    """
+    Context in which jax runs in double precision, which the models need to
+    agree with the numpy backend. The jax backend of the models evaluates
+    in it, so the global jax_enable_x64 setting of the user is not changed.
+    """
+    if hasattr(jax, "enable_x64"):
+        return jax.enable_x64(True)
+
+    # jax < 0.6
+    from jax.experimental import enable_x64
+
+    return enable_x64()
+
+
+def calc_ion_spec_jax(gamma, base_energy, deltaE):
+    """
+    F(E)*deltaE at the base energies, normalized like Absori._calc_ion_spec
+    """
+    F = base_energy**(1-gamma)
+    return F*deltaE/jnp.sum(F*deltaE)/base_energy
+
+
+def calc_recombination_jax(temp, ion, atomicnumber, last_ion):
+    """
+    Recombination rate of every ion (packed)
+    """
+    t4 = 0.0001*temp
+    tfact = 1.033E-3/jnp.sqrt(t4)
+
+    e1 = jnp.exp(-ion[:, 4]/t4)
+    e2 = jnp.exp(-ion[:, 6]/t4)
+    arec = (ion[:, 1]*t4**(-ion[:, 2]) +
+            ion[:, 3]*t4**(-1.5)*e1*(1.0+ion[:, 5]*e2))
+
+    z2 = atomicnumber**2
+    y = 15.8*z2/t4
+    arec2 = tfact*z2*(1.735+jnp.log(y)+1/(6.*y))
+
+    return arec.at[last_ion].set(arec2)
+
+
+def calc_num_jax(temp, xi, gamma, data):
+    """
+    Ionization balance for the packed ions. Same calc as Absori._calc_num,
+    with segment reductions instead of reduceat.
+    """
+    n_elements = data["atomicnumber"].shape[0]
+    ion_element = data["ion_element"]
+
+    # where() with safe values, so the gradients stay finite
+    xil = jnp.where(xi > 0, jnp.log(jnp.where(xi > 0, xi, 1.0)), -100.0)
+
+    arec = calc_recombination_jax(temp, data["ion"], data["atomicnumber"],
+                                  data["last_ion"])
+    spec = calc_ion_spec_jax(gamma, data["base_energy"], data["deltaE"])
+    intgral = jnp.dot(spec, data["sigma"])
+
+    valid = arec != 0
+    ratio = jnp.where(valid,
+                      jnp.log(3.2749e-6*jnp.where(valid, intgral, 1.0)) -
+                      jnp.log(jnp.where(valid, arec, 1.0)),
+                      0.0)
+
+    # cumsum of ratio within every element
+    ratcumsum = jnp.cumsum(ratio)
+    ratcumsum -= (ratcumsum-ratio)[data["element_start"]][ion_element]
+
+    mul = ratcumsum + (data["ion_stage"]+1)*xil
+    mult = jnp.maximum(jax.ops.segment_max(mul, ion_element, num_segments=n_elements),
+                       0.0)
+    emul = jnp.exp(mul-mult[ion_element])
+
+    s = jax.ops.segment_sum(emul, ion_element, num_segments=n_elements)
+    s += jnp.exp(-mult)
+
+    # num of ion j is given by mul of ion j-1 (0 for the neutral atom)
+    return jnp.exp(mul-ratio-xil-(mult+jnp.log(s))[ion_element])
+
+
+def calc_base_opacity_jax(temp, xi, gamma, abundance, fe_abundance, data):
+    """
+    Opacity at the base energies
+    """
+    ab = data["abundance"]
+    ab = ab.at[2:-1].multiply(10**abundance)
+    ab = ab.at[-1].multiply(10**fe_abundance)
+
+    num = calc_num_jax(temp, xi, gamma, data)*ab[data["ion_element"]]
+
+    return jnp.dot(data["sigma"], num)*6.6e-5
+
+
+def interp_opacity_jax(ekev, base_energy, base_opacity):
+    """
+    Opacity at the energies ekev. Linear interpolation on the base energies,
+    constant below and a powerlaw with slope -3 above the grid.
+    """
+    e = 1000*ekev
+
+    # jnp.interp is constant outside of the grid
+    opacity = jnp.interp(e, base_energy, base_opacity)
+
+    return jnp.where(e > base_energy[-1],
+                     base_opacity[-1]*(e/base_energy[-1])**-3.0,
+                     opacity)
+
+
+@jax.jit
+def absori_jax(x, NH, redshift, temp, xi, gamma, abundance, fe_abundance, data):
+    """
+    Absori transmission exp(-NH*opacity)
+    """
+    base_opacity = calc_base_opacity_jax(temp, xi, gamma, abundance, fe_abundance,
+                                         data)
+
+    return jnp.exp(-NH*interp_opacity_jax(x*(1+redshift), data["base_energy"],
+                                          base_opacity))
+
+
+@partial(jax.jit, static_argnames=("nz",))
+def integrate_absori_jax(x, n0, delta, redshift, temp, xi, gamma, abundance,
+                         fe_abundance, data, nz):
+    """
+    Integrate_Absori transmission for nz redshift shells. nz has to be static,
+    it is int(redshift/0.02) in the model.
+    """
+    base_opacity = calc_base_opacity_jax(temp, xi, gamma, abundance, fe_abundance,
+                                         data)
+
+    # 1+z and the weight (n*dl) of all redshift shells
+    zsam = redshift/nz
+    z1 = 1.0+zsam*(jnp.arange(nz)+0.5)
+    zf = (z1**2/jnp.sqrt(data["omegam"]*z1**3+data["omegal"]) *
+          zsam*data["c"]*n0*z1**delta*data["cmpermpc"]/data["h0"])
+
+    # factor 1*e-22
+    xsec = jax.vmap(lambda z: interp_opacity_jax(x*z, data["base_energy"],
+                                                 base_opacity))(z1)*1e-22
+
+    return jnp.exp(-jnp.dot(zf, xsec))
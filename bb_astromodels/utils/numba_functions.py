@@ -1,10 +1,164 @@
-from numba import njit
+from numba import float64, int64, njit, prange, types
 import numpy as np
 
-@njit
-def powerlaw(E, C, gamma):
-    return C*E**-gamma
+# Argument types of the kernels. They are compiled for these explicit
+# signatures when this module is imported and cached on disk (cache=True),
+# so only the first import after an install or update compiles. The arrays
+# are typed read-only, so writeable arrays and the read-only memmapped atomic
+# data match the same signature. They are C-contiguous (the energy loops
+# vectorize), only the (transposed) sigma table may have any layout. Only the
+# numba backend and warmup() import this module, the ionizing spectrum is
+# calculated with numpy (Absori._calc_ion_spec).
+f8_1d = types.Array(float64, 1, "C", readonly=True)
+f8_2d = types.Array(float64, 2, "C", readonly=True)
+i8_1d = types.Array(int64, 1, "C", readonly=True)
+f8_2d_any = types.Array(float64, 2, "A", readonly=True)
 
-def calc_ion_spec_numba(gamma, base_energy, deltaE):
-    F = powerlaw(base_energy, 1, gamma)*base_energy
-    return F*deltaE/np.sum(F*deltaE)/base_energy
+
+@njit((f8_1d, float64, float64, f8_2d, f8_2d_any, i8_1d, i8_1d),
+      cache=True, nogil=True)
+def calc_num_numba(spec, temp, xi, ion, sigma, element_start, atomicnumber):
+    """
+    Ionization balance for the packed ions. Same calc as Absori._calc_num
+    but with explicit loops per element.
+    """
+    n_ions = ion.shape[0]
+    n_elements = atomicnumber.shape[0]
+
+    t4 = 0.0001*temp
+    tfact = 1.033E-3/np.sqrt(t4)
+    if xi <= 0:
+        xil = -100.0
+    else:
+        xil = np.log(xi)
+
+    # photoionization integral of every ion
+    intgral = np.zeros(n_ions)
+    for k in range(sigma.shape[0]):
+        for j in range(n_ions):
+            intgral[j] += spec[k]*sigma[k, j]
+
+    num = np.zeros(n_ions)
+    ratio = np.zeros(n_ions)
+    mul = np.zeros(n_ions)
+    for iz in range(n_elements):
+        start = element_start[iz]
+        if iz == n_elements-1:
+            stop = n_ions
+        else:
+            stop = element_start[iz+1]
+
+        # max over all stages incl. the neutral atom (mul=0), so all
+        # exponents in the sum are <= 0
+        mult = 0.0
+        cumsum = 0.0
+        for j in range(start, stop):
+            if j == stop-1:
+                z2 = atomicnumber[iz]**2
+                y = 15.8*z2/t4
+                arec = tfact*z2*(1.735+np.log(y)+1/(6.*y))
+            else:
+                e1 = np.exp(-ion[j, 4]/t4)
+                e2 = np.exp(-ion[j, 6]/t4)
+                arec = (ion[j, 1]*t4**(-ion[j, 2]) +
+                        ion[j, 3]*t4**(-1.5)*e1*(1.0+ion[j, 5]*e2))
+            if arec != 0:
+                ratio[j] = np.log(3.2749e-6*intgral[j])-np.log(arec)
+            cumsum += ratio[j]
+            mul[j] = cumsum + (j-start+1)*xil
+            if mul[j] > mult:
+                mult = mul[j]
+
+        s = np.exp(-mult)
+        for j in range(start, stop):
+            s += np.exp(mul[j]-mult)
+        lognorm = mult+np.log(s)
+
+        # num of ion j is given by mul of ion j-1 (0 for the neutral atom)
+        prev = 0.0
+        for j in range(start, stop):
+            num[j] = np.exp(prev-lognorm)
+            prev = mul[j]
+
+    return num
+
+
+@njit((f8_1d, f8_1d, f8_2d_any, i8_1d), cache=True, parallel=True, nogil=True)
+def calc_base_opacity_numba(num, ab, sigma, ion_element):
+    """
+    Contract the abundance weighted num with the sigma table.
+    """
+    n_ions = num.shape[0]
+    weights = np.empty(n_ions)
+    for j in range(n_ions):
+        weights[j] = num[j]*ab[ion_element[j]]
+
+    base_opacity = np.zeros(sigma.shape[0])
+    for k in prange(sigma.shape[0]):
+        tmp = 0.0
+        for j in range(n_ions):
+            tmp += sigma[k, j]*weights[j]
+        base_opacity[k] = tmp*6.6e-5
+    return base_opacity
+
+
+@njit((float64, f8_1d, f8_1d), cache=True, nogil=True)
+def interp_opacity_numba(e, base_energy, base_opacity):
+    """
+    Opacity at a single energy e (in eV). Linear interpolation on the base
+    energies, constant below and a powerlaw with slope -3 above the grid.
+    """
+    n = base_energy.shape[0]
+    if e <= base_energy[0]:
+        return base_opacity[0]
+    if e >= base_energy[n-1]:
+        return base_opacity[n-1]*(e/base_energy[n-1])**-3.0
+
+    # binary search for the bin
+    lo = 0
+    hi = n-1
+    while hi-lo > 1:
+        mid = (lo+hi)//2
+        if base_energy[mid] <= e:
+            lo = mid
+        else:
+            hi = mid
+    slope = (base_opacity[hi]-base_opacity[lo])/(base_energy[hi]-base_energy[lo])
+    return slope*(e-base_energy[lo])+base_opacity[lo]
+
+
+@njit((f8_1d, float64, float64, f8_1d, float64, float64, f8_1d, f8_2d, f8_2d_any,
+       i8_1d, i8_1d, i8_1d, f8_1d), cache=True, parallel=True, nogil=True)
+def absori_numba(x, NH, redshift, spec, temp, xi, ab, ion, sigma, ion_element,
+                 element_start, atomicnumber, base_energy):
+    """
+    Full absori transmission exp(-NH*opacity) in one kernel. The opacity
+    is computed on the base energies and interpolated in a single pass
+    over the energies.
+    """
+    num = calc_num_numba(spec, temp, xi, ion, sigma, element_start,
+                         atomicnumber)
+    base_opacity = calc_base_opacity_numba(num, ab, sigma, ion_element)
+
+    res = np.empty(x.shape[0])
+    for i in prange(x.shape[0]):
+        e = 1000*x[i]*(1+redshift)
+        res[i] = np.exp(-NH*interp_opacity_numba(e, base_energy, base_opacity))
+    return res
+
+
+@njit((f8_1d, f8_1d, f8_1d, f8_1d, f8_1d), cache=True, parallel=True, nogil=True)
+def integrate_absori_numba(x, z1, zf, base_energy, base_opacity):
+    """
+    Transmission of the redshift shells with 1+z=z1 and weights zf,
+    accumulated per energy in a single pass.
+    """
+    res = np.empty(x.shape[0])
+    for i in prange(x.shape[0]):
+        tau = 0.0
+        for j in range(z1.shape[0]):
+            # factor 1*e-22
+            tau += zf[j]*interp_opacity_numba(1000*x[i]*z1[j], base_energy,
+                                              base_opacity)*1e-22
+        res[i] = np.exp(-tau)
+    return res
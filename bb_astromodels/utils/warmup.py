@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def warmup(background=False):
+    """
+    Do the one-time startup work up front instead of in the first model call:
+    compile the numba kernels (or load them from the on-disk numba cache),
+    load the atomic data of the models and run every numba kernel once, which
+    also starts the numba thread pool.
+
+    In the background only the models are imported and the atomic data is
+    loaded, the bulk of the startup time. The numba kernels are left to the
+    main thread (a later warmup() or the first call with the numba backend):
+    loading the parallel kernels in an other than the main thread
+    initializes the TBB threading layer there, which hangs the interpreter
+    at exit.
+
+    :param background: run in a daemon thread and return immediately
+    :return: the thread if background is True, otherwise the time in seconds
+    """
+    if background:
+        thread = threading.Thread(target=_warmup, kwargs=dict(numba_kernels=False),
+                                  name="bb_astromodels-warmup", daemon=True)
+        thread.start()
+
+        return thread
+
+    return _warmup()
+
+
+def _warmup(numba_kernels=True):
+    t_start = time.perf_counter()
+
+    from bb_astromodels.xray.absorption import Absori, Integrate_Absori
+
+    t_import = time.perf_counter()
+
+    if numba_kernels:
+        # compiles the kernels for their explicit signatures or loads them
+        # from the cache
+        import bb_astromodels.utils.numba_functions  # noqa: F401
+
+    t_compile = time.perf_counter()
+
+    x = np.geomspace(0.1, 10, 10)
+    for model_class in (Absori, Integrate_Absori):
+        # the atomic data is shared by all instances
+        model = model_class()
+
+        if not numba_kernels:
+            continue
+
+        model.backend = "numba"
+
+        # redshift > 0, so Integrate_Absori has redshift shells
+        values = model.get_parameter_vector()
+        values[list(model.parameters).index("redshift")] = 0.1
+        model.fast_evaluate(x, values)
+
+    t_end = time.perf_counter()
+
+    log.info(f"Warmup done in {1000*(t_end-t_start):.0f} ms (imports "
+             f"{1000*(t_import-t_start):.0f} ms, numba kernels "
+             f"{1000*(t_compile-t_import):.0f} ms)")
+
+    return t_end-t_start
@@ -1,19 +1,40 @@
+import logging
 import os
-import sys
-from functools import lru_cache, wraps
+import time
+from types import SimpleNamespace
 
 import astropy.units as astropy_units
 import numpy as np
-import six
 from astromodels.functions.function import Function1D, FunctionMeta
-from astromodels.utils import configuration
-from astropy.io import fits
-from numba import njit
-from scipy.interpolate import interp1d
 
-from bb_astromodels.utils.cache import cache_array_method
+from bb_astromodels.utils.atomic_data import get_shared_data, load_bundle
+from bb_astromodels.utils.autotune import autotuner
+from bb_astromodels.utils.cache import array_fingerprint, cache_stage
 from bb_astromodels.utils.data_files import _get_data_file_path
-from bb_astromodels.utils.numba_functions import calc_ion_spec_numba
+
+# numba (jit compilation) and astropy.io.fits (only needed to rebuild the
+# atomic data bundle) are imported where they are used, to keep the import fast
+
+log = logging.getLogger(__name__)
+
+_backends = ("numpy", "numba", "jax", "auto")
+
+_dtypes = ("float64", "float32")
+
+
+def _import_jax_functions():
+    """
+    Import the jax implementation of the models. jax is an optional dependency,
+    so it is only imported if the jax backend is used.
+    """
+    try:
+        from bb_astromodels.utils import jax_functions
+
+    except ImportError:
+
+        raise ImportError("The jax backend needs jax. Install it with pip install jax")
+
+    return jax_functions
 
 
 class Absori(Function1D, metaclass=FunctionMeta):
@@ -85,91 +106,628 @@ class Absori(Function1D, metaclass=FunctionMeta):
 
     """
 
+    # version of the post-processing of the atomic data, increase it if the
+    # loaders change, so the bundles in the cache directory are rebuilt
+    _atomic_data_version = 1
+
+    # the elements in this model
+    _absori_elements = ["H", "He", "C", "N", "O",
+                        "Ne", "Mg", "Si", "S", "Fe"]
+
+    # rough upper limit of the bytes of temporary arrays per energy
+    # in one evaluation, used to get the chunk size for the memory budget
+    _bytes_per_energy = 96
+
+    # a segment of the base energies contains an absorption edge if sigma
+    # of one ion rises by more than this factor. These segments are split in
+    # _edge_subdivisions parts for the bin integration.
+    _edge_jump = 1.5
+    _edge_subdivisions = 4
+
+    # gauss-legendre nodes per part of an energy bin
+    _n_bin_nodes = 2
+
+    # strategies of the auto backend: name -> (backend, use the design matrix)
+    _auto_strategies = {"numpy_interpolate": ("numpy", False),
+                        "numpy_design_matrix": ("numpy", True),
+                        "numba": ("numba", None)}
+
     def _setup(self):
         self._fixed_units = (
             astropy_units.keV, astropy_units.dimensionless_unscaled)
-        # the elements in this model
-        self._absori_elements = ["H", "He", "C", "N", "O",
-                                 "Ne", "Mg", "Si", "S", "Fe"]
+        # atomic data and everything derived from it. Loaded once and
+        # shared (read-only) by all instances
+        for key, value in get_shared_data(self._atomic_data_key(),
+                                          self._precalc_atomic_data).items():
+            setattr(self, key, value)
+
+        self._backend = "numpy"
+
+        # float type of the sigma table, the interpolation and the contraction
+        self._dtype = np.dtype("float64")
+
+        # sigma table used for the contraction and the interpolation. The full
+        # table or a decimated one, see sigma_tolerance
+        self._sigma_tolerance = None
+        self._sigma_table_error = 0.0
+        self._set_sigma_table(np.arange(len(self._base_energy)))
+
+        # max memory for the temporary arrays per evaluation, None means no limit
+        self._memory_budget = None
+
+        # matrix with the interpolated sigma of all ions, only
+        # used if the redshift is fixed
+        self._design_matrix = None
+
+        # atomic data as jax arrays per precision (jax_enable_x64), only used
+        # by the jax backend
+        self._jax_data = {}
+
+        # design matrix switch chosen by the auto backend (None: use the grid size)
+        # and the strategy forced while the auto backend benchmarks
+        self._design_matrix_mode = None
+        self._strategy_override = None
+
+        # per instance caches with the inputs and results of the last calls
+        # of every stage. The stages depend on the parameters like this:
+        # gamma -> ion_spec -> photo_integral, temp -> recombination,
+        # (temp, xi, gamma, abundances) -> num -> partial_ion_weights
+        # -> partial_base_opacity, (x, redshift) -> interp_weights,
+        # (x, redshift, temp, xi, gamma, abundances) -> partial_opacity
+        # the abundances are only in the key if they are fixed, see _split_abundance
+        # a stage only reruns if one of its inputs changed.
+        self._stages = {}
+        self._stage_sizes = {}
+
+    @property
+    def backend(self):
+        """
+        The backend used to evaluate the model. "numpy", "numba"
+        (fused and parallel numba kernel) or "jax" (jit-compiled jax.numpy
+        implementation on the CPU, needs jax). The jax backend runs in
+        double precision and agrees with the numpy backend to a relative
+        tolerance of 1e-10. Double precision is only enabled during the calls
+        of the model (scoped), the global jax_enable_x64 setting is not
+        changed. See get_jax_function for the precision of the pure jax
+        function.
+        "auto" benchmarks the numpy and numba strategies once per grid size
+        (power of 2), pattern of free parameters and settings (dtype,
+        sigma_tolerance, memory_budget) and then always uses the fastest.
+        The numba kernels ignore these settings, so they are only a candidate
+        if all of them have their default. The choices are stored in the
+        cache directory, see autotune_choices.
+        """
+        return self._backend
 
-        # load database for absori
-        self._ion, self._sigma, self._atomicnumber, self._base_energy = self._load_sigma()
+    @backend.setter
+    def backend(self, value):
+        assert value in _backends, f"{value} not a valid backend. Valid backends: {_backends}"
+
+        if value == "jax":
+            # fail early if jax is not installed. The module is not stored on
+            # the instance, so the model can still be copied and pickled
+            _import_jax_functions()
+
+        self._backend = value
+
+    @property
+    def dtype(self):
+        """
+        Float type used for the sigma table, the interpolation and the
+        contraction with the numpy backend. "float64" (default) or "float32".
+        float32 halves the memory traffic of the contraction and the
+        interpolation. The relative error of the transmission is ~1e-6
+        (~1e-5 for Integrate_Absori, which sums many shells), see
+        benchmarks/float32_mode.py. The ionization balance is always solved
+        in float64.
+        """
+        return self._dtype.name
+
+    @dtype.setter
+    def dtype(self, value):
+        assert value in _dtypes, f"{value} not a valid dtype. Valid dtypes: {_dtypes}"
+
+        self._dtype = np.dtype(value)
+        self._sigma_dtype = self._table_sigma.astype(self._dtype, copy=False)
+
+        # all cached stages after the balance depend on the dtype
+        self.clear_cache()
+
+    @property
+    def autotune_choices(self):
+        """
+        The strategies chosen by the auto backend for this model with the
+        measured time per fit step of all strategies, key
+        "n_energies_bucket|free_parameters|numba_threads|dtype|sigma_tolerance|memory_budget"
+        -> choice
+        """
+        prefix = f"{type(self).__name__}|"
+
+        return {key[len(prefix):]: choice for key, choice in autotuner.choices.items()
+                if key.startswith(prefix)}
+
+    def reset_autotune(self):
+        """
+        Forget the choices of the auto backend for this model
+        """
+        autotuner.clear(f"{type(self).__name__}|")
+
+    def _autotune_key(self, x):
+        """
+        Key of the auto backend choice: model, grid size rounded to a power of 2,
+        pattern of free parameters, number of numba threads and the settings
+        that change the cost and the candidates (dtype, sigma_tolerance,
+        memory_budget)
+        """
+        from numba import get_num_threads
+
+        free = "".join("1" if p.free else "0" for p in self.parameters.values())
+
+        return (f"{type(self).__name__}|2^{int(np.log2(max(len(x), 1)))}|{free}|"
+                f"{get_num_threads()}|{self.dtype}|{self._sigma_tolerance}|"
+                f"{self._memory_budget}")
+
+    def _select_backend(self, x, values):
+        """
+        The backend for this call. For the auto backend the fastest strategy is
+        looked up (or benchmarked once) and the design matrix switch is set.
+        """
+        if self._backend != "auto":
+            self._design_matrix_mode = None
+            return self._backend
+
+        strategy = self._strategy_override
+
+        if strategy is None:
+            key = self._autotune_key(x)
+            strategy = autotuner.get(key)
+
+            if strategy not in self._get_auto_strategies():
+                strategy = autotuner.tune(key, self._benchmark_strategies(x, values))
+
+        backend, self._design_matrix_mode = self._auto_strategies[strategy]
+
+        return backend
+
+    def _get_auto_strategies(self):
+        """
+        Strategies of the auto backend that can be used in the current setup.
+        The design matrix needs a fixed redshift. The numba kernels always use
+        the full float64 sigma table and the whole grid at once, so they are
+        only a candidate without dtype float32, sigma_tolerance and
+        memory_budget: the auto backend must give the numbers of the
+        configured numpy path.
+        """
+        use_numba = (self._dtype == np.float64 and self._sigma_tolerance is None
+                     and self._memory_budget is None)
+
+        return [strategy for strategy, (backend, design_matrix) in self._auto_strategies.items()
+                if (self.redshift.fix or not design_matrix)
+                and (use_numba or backend != "numba")]
+
+    def _benchmark_strategies(self, x, values, n_steps=4):
+        """
+        Callables that run n_steps typical fit steps (one free parameter changed
+        per call) with every strategy, for the autotuner.
+        """
+        free = [i for i, p in enumerate(self.parameters.values()) if p.free]
+
+        steps = []
+        for i in range(n_steps):
+            step = list(values)
+            if free:
+                k = free[i % len(free)]
+                step[k] = step[k]*(1+1e-6*(i+1)) if step[k] != 0 else 1e-6*(i+1)
+            steps.append(step)
+
+        def benchmark(strategy):
+            def run():
+                self._strategy_override = strategy
+                try:
+                    if not free:
+                        self.clear_cache()
+                    for step in steps:
+                        self.evaluate(x, *step)
+                finally:
+                    self._strategy_override = None
+
+            return run
+
+        return {strategy: benchmark(strategy) for strategy in self._get_auto_strategies()}
+
+    @property
+    def sigma_tolerance(self):
+        """
+        Relative tolerance for a decimated sigma table, or None (default) for the
+        full table with 721 energies. The decimated table only keeps the base
+        energies needed so that the linear interpolation of sigma of all ions
+        deviates from the full table by at most this tolerance. It is dense around
+        the edges and sparse in the smooth parts. The opacity is a positive
+        sum of the sigmas, so its relative error is bounded by the same tolerance.
+        Used for the contraction and interpolation of the numpy backend, which
+        get cheaper with the size of the table, see sigma_table_info.
+        """
+        return self._sigma_tolerance
+
+    @sigma_tolerance.setter
+    def sigma_tolerance(self, value):
+        if value is None:
+            keep, error = np.arange(len(self._base_energy)), 0.0
+
+        else:
+            assert value > 0, f"{value} not a valid sigma_tolerance"
+
+            keep, error = self._decimate_sigma(value)
+
+        self._sigma_tolerance = value
+        self._sigma_table_error = error
+        self._set_sigma_table(keep)
+
+        # all cached stages after the balance depend on the table
+        self.clear_cache()
+
+    @property
+    def sigma_table_info(self):
+        """
+        Size of the sigma table in use and the max relative error of its
+        interpolation compared to the full table
+        """
+        return dict(n_energies=len(self._table_energy),
+                    n_base_energies=len(self._base_energy),
+                    tolerance=self._sigma_tolerance,
+                    max_rel_error=self._sigma_table_error)
+
+    def _set_sigma_table(self, keep):
+        """
+        Use the base energies with the indices keep for the contraction and the
+        interpolation. keep has to include the first and the last energy.
+        """
+        if len(keep) == len(self._base_energy):
+            # the full table, no copy of the shared arrays
+            self._table_energy = self._base_energy
+            self._table_sigma = self._sigma
+
+        else:
+            self._table_energy = self._base_energy[keep]
+            self._table_sigma = self._sigma[keep]
+
+        self._sigma_dtype = self._table_sigma.astype(self._dtype, copy=False)
+
+        # segment of the table for every segment of the base energies, so the bins
+        # can still be found on the base energies
+        self._table_segment = np.searchsorted(keep, np.arange(len(self._base_energy)-1),
+                                              side="right")-1
+
+    def _decimate_sigma(self, tolerance):
+        """
+        Select the base energies for a decimated sigma table. Greedy: starting from
+        the last kept energy, the next kept energy is the farthest one for which the
+        linear interpolation reproduces sigma of all ions at all energies in between
+        within the relative tolerance (and zeros exactly).
+        Returns the kept indices and the max relative error.
+        """
+        e = self._base_energy
+        sigma = self._sigma
+        n = len(e)
+
+        keep = [0]
+        max_error = 0.0
+        start = 0
+        while start < n-1:
+            stop = start+1
+            stop_error = 0.0
+
+            while stop < n-1:
+                inner = slice(start+1, stop+1)
+                w = ((e[inner]-e[start])/(e[stop+1]-e[start]))[:, np.newaxis]
+                diff = np.abs(sigma[start]+w*(sigma[stop+1]-sigma[start])-sigma[inner])
+
+                if np.any(diff > tolerance*np.abs(sigma[inner])):
+                    break
+
+                nonzero = sigma[inner] != 0
+                stop += 1
+                stop_error = np.max(diff[nonzero]/np.abs(sigma[inner][nonzero]), initial=0.0)
+
+            keep.append(stop)
+            max_error = max(max_error, stop_error)
+            start = stop
+
+        return np.array(keep), float(max_error)
+
+    def _get_jax_data(self):
+        """
+        The atomic data and constants of the model as jax arrays in the current
+        jax precision. Built once per precision on first use.
+        """
+        import jax
+        import jax.numpy as jnp
+
+        x64 = jax.config.jax_enable_x64
+
+        if x64 not in self._jax_data:
+            data = dict(ion=self._ion,
+                        sigma=self._sigma,
+                        atomicnumber=self._atomicnumber.astype(float),
+                        ion_element=self._ion_element,
+                        ion_stage=self._ion_stage,
+                        element_start=self._element_start,
+                        last_ion=np.nonzero(self._mask_2)[0],
+                        base_energy=self._base_energy,
+                        deltaE=self._deltaE,
+                        abundance=self._abundance)
+            data.update(self._jax_constants())
+
+            self._jax_data[x64] = {key: jnp.asarray(value) for key, value in data.items()}
+
+        return self._jax_data[x64]
+
+    def _jax_constants(self):
+        """
+        Additional constants of the model needed by the jax implementation
+        """
+        return {}
+
+    def __reduce__(self):
+        """
+        Pickle (and deepcopy, which astromodels implements with pickle)
+        without the jax arrays. They are rebuilt on first use, unpickled
+        outside of the double precision scope they would be truncated to
+        float32.
+        """
+        unpickler, args, state = super().__reduce__()
+
+        state["__dict__"] = dict(state["__dict__"], _jax_data={})
 
-        self._max_atomicnumber = int(np.max(self._atomicnumber))
+        return unpickler, args, state
 
-        self._sigma = self._sigma.T
+    def get_jax_function(self):
+        """
+        Get the model as a pure jax function f(x, *parameter_values) with the
+        parameter values in the order and units of evaluate. It can be
+        jit-compiled, vmapped over parameter batches and differentiated
+        with jax.grad.
+        The function runs in the precision of the surrounding jax code, this
+        package never changes the global jax_enable_x64 setting. Enable it
+        (jax.config.update("jax_enable_x64", True) or the jax.enable_x64
+        context) to agree with the numpy backend to 1e-10. In the jax default
+        float32 the error of the transmission is ~1e-6 (~1e-5 relative).
+        """
+        jax_functions = _import_jax_functions()
+
+        def absori(x, NH, redshift, temp, xi, gamma, abundance, fe_abundance):
+            return jax_functions.absori_jax(x, NH, redshift, temp, xi, gamma,
+                                            abundance, fe_abundance,
+                                            self._get_jax_data())
+
+        return absori
+
+    @property
+    def memory_budget(self):
+        """
+        Max memory in bytes for the temporary arrays of one evaluation with the
+        numpy backend. Energy grids that need more are evaluated in chunks that
+        fit in the budget and are written to one preallocated output array.
+        The caches per energy grid are not used in this case.
+        None (default) means no limit.
+        """
+        return self._memory_budget
+
+    @memory_budget.setter
+    def memory_budget(self, value):
+        assert value is None or value >= self._bytes_per_energy, \
+            f"memory_budget must be None or at least {self._bytes_per_energy} bytes"
+
+        self._memory_budget = value
+
+    def _chunks(self, n):
+        """
+        Get the slices of the chunks for an energy grid with n entries,
+        or None if the grid fits in the memory budget.
+        """
+        if self._memory_budget is None:
+            return None
+
+        chunk_size = int(self._memory_budget//self._bytes_per_energy)
+        if n <= chunk_size:
+            return None
+
+        return [slice(start, min(start+chunk_size, n))
+                for start in range(0, n, chunk_size)]
+
+    @property
+    def cache_sizes(self):
+        """
+        The number of cached results of every stage of the calculation
+        """
+        return {stage: self._stage_sizes.get(stage, maxsize)
+                for stage, maxsize in self._cached_stages().items()}
+
+    def set_cache_size(self, stage, maxsize):
+        """
+        Set the number of cached results of one stage of the calculation
+        (see cache_sizes for the stages). The oldest results are evicted first.
+        """
+        stages = self._cached_stages()
+        assert stage in stages, f"{stage} not a valid stage. Valid stages: {list(stages)}"
+        assert maxsize >= 1, "maxsize must be at least 1"
+
+        self._stage_sizes[stage] = int(maxsize)
+
+        cache = self._stages.get(stage, {})
+        while len(cache) > maxsize:
+            cache.popitem(last=False)
+
+    def clear_cache(self):
+        """
+        Clear the cached results of all stages
+        """
+        self._stages.clear()
+        self._design_matrix = None
 
-        self._base_energy = np.array(self._base_energy, dtype=float)
+    @classmethod
+    def _cached_stages(cls):
+        """
+        Get all cached stages of the class with their default size
+        """
+        stages = {}
+        for c in reversed(cls.__mro__):
+            for attr in vars(c).values():
+                if hasattr(attr, "stage"):
+                    stages[attr.stage] = attr.maxsize
+        return stages
+
+    @classmethod
+    def _atomic_data_key(cls):
+        """
+        Key of the shared atomic data. Includes the class constants the
+        precalc depends on.
+        """
+        return ("absori", cls._edge_jump, cls._edge_subdivisions)
 
-        # precalc two masks needed in the calc
-        # valid entries of the num matrix
-        self._mask_valid = np.zeros_like(self._ion[:, :, 0], dtype=bool)
-        for i, n in enumerate(self._atomicnumber):
-            self._mask_valid[i, :n] = True
+    @classmethod
+    def _precalc_atomic_data(cls):
+        """
+        Load the atomic data and precalc everything that only depends on it.
+        Returns a dict attribute name -> value.
+        """
+        data = SimpleNamespace()
 
-        self._mask_2 = np.zeros_like(self._ion[:, :, 0], dtype=bool)
-        for i, n in enumerate(self._atomicnumber-1):
-            self._mask_2[i, n] = True
+        # load database for absori
+        arrays = cls._load_atomic_data()
+
+        data._ion = arrays["ion"]
+        data._ion_element = arrays["ion_element"]
+        data._atomicnumber = arrays["atomicnumber"]
+        sigma = arrays["sigma"]
+        base_energy = arrays["base_energy"]
+
+        data._max_atomicnumber = int(np.max(data._atomicnumber))
+
+        data._sigma = sigma.T
+
+        data._base_energy = np.array(base_energy, dtype=float)
+
+        # the ions are stored packed (only the valid ions, element by element).
+        # precalc the index maps back to element and ionization stage
+        data._n_ions = len(data._ion_element)
+        data._element_start = np.searchsorted(data._ion_element,
+                                              np.arange(len(data._atomicnumber)))
+        data._ion_stage = (np.arange(data._n_ions) -
+                           data._element_start[data._ion_element])
+
+        # mask for the last ion of every element
+        data._mask_2 = (data._ion_stage ==
+                        data._atomicnumber[data._ion_element]-1)
+
+        # the base energies are uniform in log(e) up to the float32 rounding in
+        # the data file, so the bin of an energy can be found by arithmetic and
+        # one correction step. Fall back to a binary search for other grids.
+        log_e = np.log(data._base_energy)
+        dlog = (log_e[-1]-log_e[0])/(len(log_e)-1)
+        if np.max(np.abs(log_e-log_e[0]-np.arange(len(log_e))*dlog)) < 0.5*dlog:
+            data._log_grid = (log_e[0], 1/dlog)
+        else:
+            data._log_grid = None
 
-        # build the interpolation of sigma
-        self._interp_sigma = interp1d(self._base_energy, self._sigma, axis=0)
+        # rest frame energies (eV) where the bins are split for the bin integration.
+        # The interpolated opacity is linear between the base energies, so these
+        # are the base energies plus extra points in the segments with an
+        # absorption edge, where the transmission changes by orders of magnitude.
+        edge = np.any(data._sigma[1:] > cls._edge_jump*data._sigma[:-1], axis=1)
+        edge_points = np.linspace(data._base_energy[:-1][edge], data._base_energy[1:][edge],
+                                  cls._edge_subdivisions+1)
+        data._breakpoint_energies = np.union1d(data._base_energy, edge_points)
 
         # precalc the "deltaE" per ebin in the base energy
-        self._deltaE = np.zeros(len(self._base_energy))
-        self._deltaE[0] = (self._base_energy[1]-self._base_energy[0])
-        self._deltaE[-1] = (self._base_energy[-1]-self._base_energy[-2])
-        self._deltaE[1:-1] = (self._base_energy[2:]-self._base_energy[0:-2])/2
+        data._deltaE = np.zeros(len(data._base_energy))
+        data._deltaE[0] = (data._base_energy[1]-data._base_energy[0])
+        data._deltaE[-1] = (data._base_energy[-1]-data._base_energy[-2])
+        data._deltaE[1:-1] = (data._base_energy[2:]-data._base_energy[0:-2])/2
 
         # load abundance
-        self._abundance = self._load_abundance()
+        data._abundance = arrays["abundance"]
+
+        # abundance group of every element, 0: H and He, 1: elements>He, 2: Fe.
+        # The abundance parameters only scale the opacity of groups 1 and 2.
+        data._abundance_group = np.ones(len(cls._absori_elements), dtype=int)
+        data._abundance_group[:2] = 0
+        data._abundance_group[-1] = 2
+
+        return vars(data)
+
+    @classmethod
+    def _load_atomic_data(cls):
+        """
+        Load the post-processed atomic data arrays from the memory-mapped
+        bundle in the cache directory. It is built from mansig.fits and
+        abundances.dat on the first run and rebuilt if their checksums change.
+        """
+        t_start = time.perf_counter()
+
+        sources = [_get_data_file_path(os.path.join("ionized", "mansig.fits")),
+                   _get_data_file_path(os.path.join("abundance", "abundances.dat"))]
+
+        arrays = load_bundle(f"absori_data_v{cls._atomic_data_version}",
+                             cls._atomic_data_version, sources,
+                             cls._load_atomic_data_from_sources)
+
+        # the arrays are not memory-mapped if the bundle could not be written
+        source = ("bundle" if isinstance(arrays["sigma"], np.memmap)
+                  else "mansig.fits and abundances.dat")
+
+        log.info(f"Loaded the atomic data ({len(arrays['ion'])} ions, "
+                 f"{len(arrays['base_energy'])} energies) from the {source} "
+                 f"in {1000*(time.perf_counter()-t_start):.1f} ms")
 
-    def _load_sigma(self):
+        return arrays
+
+    @classmethod
+    def _load_atomic_data_from_sources(cls):
+        """
+        Load the atomic data arrays from mansig.fits and abundances.dat
+        """
+        ion, sigma, ion_element, atomicnumber, energy = cls._load_sigma()
+
+        return dict(ion=ion, sigma=sigma, ion_element=ion_element,
+                    atomicnumber=atomicnumber, base_energy=energy,
+                    abundance=cls._load_abundance())
+
+    @classmethod
+    def _load_sigma(cls):
         """
         Load the base data for absori.
-        Not the most efficient way but only needed
-        in the precalc.
+        The ions are stored packed, sorted by Z and within an element in
+        the order of the file (descending ION). ion_element gives the
+        element index of every ion.
         """
-        ion = np.zeros((10, 26, 10))
-        sigma = np.zeros((10, 26, 721))
-        atomicnumber = np.empty(10, dtype=int)
+        from astropy.io import fits
 
         with fits.open(_get_data_file_path(
                 os.path.join(
                     "ionized", "mansig.fits"))
         ) as f:
-            znumber = f["SIGMAS"].data["Z"]
-            ionnumber = f["SIGMAS"].data["ION"]
-            sigmadata = f["SIGMAS"].data["SIGMA"]
-            iondata = f["SIGMAS"].data["IONDATA"]
+            znumber = np.asarray(f["SIGMAS"].data["Z"])
+            ionnumber = np.asarray(f["SIGMAS"].data["ION"])
+            sigmadata = np.vstack(f["SIGMAS"].data["SIGMA"]).astype(float)
+            iondata = np.vstack(f["SIGMAS"].data["IONDATA"]).astype(float)
 
-            energy = f["ENERGIES"].data["ENERGY"]
+            energy = np.asarray(f["ENERGIES"].data["ENERGY"])
 
-        currentZ = -1
-        iZ = -1
-        iIon = -1
-        for i in range(len(znumber)):
-            if znumber[i] != currentZ:
-                iZ += 1
-                atomicnumber[iZ] = znumber[i]
-                currentZ = znumber[i]
-                iIon = -1
-            iIon += 1
-            for k in range(10):
-                ion[iZ, iIon, k] = iondata[i][k]
+        order = np.lexsort((-ionnumber, znumber))
 
-            # change units of coef
+        atomicnumber, ion_element = np.unique(znumber[order].astype(int), return_inverse=True)
 
-            ion[iZ][iIon][1] *= 1.0E+10
-            ion[iZ][iIon][3] *= 1.0E+04
-            ion[iZ][iIon][4] *= 1.0E-04
-            ion[iZ][iIon][6] *= 1.0E-04
+        # change units of coef
+        ion = iondata[order]*np.array([1.0, 1.0E+10, 1.0, 1.0E+04, 1.0E-04,
+                                       1.0, 1.0E-04, 1.0, 1.0, 1.0])
 
-            for k in range(721):
-                sigma[iZ][iIon][k] = sigmadata[i][k]/6.6e-27
+        sigma = sigmadata[order]/6.6e-27
 
-        return ion, sigma, atomicnumber, energy
+        return ion, sigma, ion_element, atomicnumber, energy
 
-    def _load_abundance(self, model="angr"):
+    @classmethod
+    def _load_abundance(cls, model="angr"):
         """
         Load the base abundance for the given model.
         Only needed in the precalc.
@@ -196,8 +754,8 @@ class Absori(Function1D, metaclass=FunctionMeta):
                 vals[i] = np.array(l[1:], dtype=float)
                 keys.append(l[0][:-1])
             keys = np.array(keys)
-        vals_all = np.zeros(len(self._absori_elements))
-        for i, element in enumerate(self._absori_elements):
+        vals_all = np.zeros(len(cls._absori_elements))
+        for i, element in enumerate(cls._absori_elements):
             assert element in ele, f"{element} not a valid element. Valid elements: {ele}"
 
             idx = np.argwhere(ele == element)[0, 0]
@@ -221,135 +779,686 @@ class Absori(Function1D, metaclass=FunctionMeta):
         self.fe_abundance.unit = astropy_units.dimensionless_unscaled
 
     def evaluate(self, x, NH, redshift, temp, xi, gamma, abundance, fe_abundance):
-        # calc energies with z
-        e = x*(1+redshift)
+        backend = self._select_backend(x, (NH, redshift, temp, xi, gamma, abundance,
+                                           fe_abundance))
+
+        if backend == "numba":
+            from bb_astromodels.utils.numba_functions import absori_numba
+
+            # the kernels are compiled for contiguous float64 arrays only
+            return absori_numba(np.ascontiguousarray(x, dtype=float), NH, redshift, self._calc_ion_spec(gamma),
+                                temp, xi, self._calc_abundance(abundance, fe_abundance),
+                                self._ion, self._sigma, self._ion_element,
+                                self._element_start, self._atomicnumber,
+                                self._base_energy)
+
+        if backend == "jax":
+            jax_functions = _import_jax_functions()
+
+            with jax_functions.enable_x64():
+                return np.asarray(jax_functions.absori_jax(
+                    x, NH, redshift, temp, xi, gamma, abundance, fe_abundance,
+                    self._get_jax_data()))
+
+        chunks = self._chunks(len(x))
+        if chunks is not None:
+            return self._evaluate_chunked(chunks, x, NH, redshift, temp, xi, gamma,
+                                          abundance, fe_abundance)
+
         # calc opacity
-        opacity = self._calc_opacity(e, temp, xi, gamma,
+        opacity = self._calc_opacity(x, redshift, temp, xi, gamma,
                                      abundance, fe_abundance)
 
-        return np.exp(-NH*opacity)
+        # the transmission is float64 in float32 mode too, also for a python
+        # float NH (which would not promote the float32 opacity)
+        return np.exp(np.multiply(-NH, opacity, dtype=float))
+
+    def fast_evaluate(self, x, parameter_values):
+        """
+        Unit-free fast path for likelihood loops. Skips the unit handling and the
+        parameter lookups of __call__ and does not change the parameters of the
+        model, so it is safe to call with trial values.
+        Uses the selected backend like evaluate.
+
+        :param x: energies in keV as float array
+        :param parameter_values: flat vector with the values of all parameters in
+            the order of the parameters (see get_parameter_vector) and the
+            units of evaluate
+        :returns: the model at x
+        """
+        assert len(parameter_values) == len(self.parameters), \
+            f"{len(parameter_values)} not a valid number of parameter values, " \
+            f"need {len(self.parameters)}"
+
+        return self.evaluate(np.asarray(x, dtype=float), *map(float, parameter_values))
+
+    def evaluate_binned(self, edges, parameter_values):
+        """
+        Transmission averaged over energy bins, for channelized fits.
+        Every bin is split at all base energies of the cross-section table it
+        contains (the interpolated opacity has a kink at each of them), and the
+        segments with an absorption edge are split in _edge_subdivisions
+        further parts. Every part is integrated with _n_bin_nodes
+        gauss-legendre nodes. Only bins that contain no base energy (the base
+        energies are 1.2% apart) keep _n_bin_nodes nodes, so typical grids are
+        subsampled everywhere: 128 log bins over 0.1-10 keV get 1968 nodes,
+        with a max error of ~1e-6 (Absori). Splitting only the segments with
+        an edge saves ~15% of the nodes there (most bins contain an edge of
+        one of the 102 ions) but raises the error to ~1e-3.
+        The nodes and weights are precalculated once per grid (and redshift)
+        and cached.
+
+        :param edges: increasing bin edges in keV (n_bins+1 values)
+        :param parameter_values: flat vector with the values of all parameters
+            like in fast_evaluate
+        :returns: mean transmission in every bin
+        """
+        edges = np.asarray(edges, dtype=float)
+        assert np.all(np.diff(edges) > 0), "edges must be increasing"
+
+        values = list(map(float, parameter_values))
+
+        nodes, weights, bins = self._get_bin_quadrature(edges, self._calc_breakpoints(values))
+
+        return np.bincount(bins, weights*self.evaluate(nodes, *values),
+                           minlength=len(edges)-1)
+
+    def _calc_breakpoints(self, values):
+        """
+        Observed energies (keV) where the bins are split
+        """
+        redshift = values[list(self.parameters).index("redshift")]
+
+        return self._breakpoint_energies/(1000*(1+redshift))
+
+    @cache_stage("bin_quadrature", maxsize=4)
+    def _get_bin_quadrature(self, edges, breakpoints):
+        """
+        Nodes, weights (including the 1/bin width) and bin index of the nodes
+        to average over the bins. The bins are split at the breakpoints.
+        """
+        # all points where a bin has to be split
+        inner = breakpoints[(breakpoints > edges[0]) & (breakpoints < edges[-1])]
+        points = np.union1d(edges, inner)
+
+        part_lo = points[:-1]
+        part_hi = points[1:]
+        part_bin = np.searchsorted(edges, part_lo, side="right")-1
+
+        node, weight = np.polynomial.legendre.leggauss(self._n_bin_nodes)
+
+        half = (0.5*(part_hi-part_lo))[:, np.newaxis]
+        nodes = (0.5*(part_hi+part_lo))[:, np.newaxis]+half*node
+        weights = half*weight/np.diff(edges)[part_bin][:, np.newaxis]
+
+        return nodes.ravel(), weights.ravel(), np.repeat(part_bin, self._n_bin_nodes)
+
+    def get_parameter_vector(self):
+        """
+        Current values of all parameters as flat vector for fast_evaluate
+        """
+        return np.array([p.value for p in self.parameters.values()])
+
+    def evaluate_batch(self, x, NH, redshift, temp, xi, gamma, abundance, fe_abundance):
+        """
+        Evaluate the model for P parameter sets at once, e.g. for the samples of a
+        sampler or a posterior predictive check. The parameters are arrays with
+        shape (P,) (scalars are used for all sets) in the units of evaluate.
+        The ionization balance is solved for all sets in one pass.
+        Always uses the numpy backend.
+
+        :param x: energies in keV
+        :returns: transmission with shape (P, len(x))
+        """
+        NH, redshift, temp, xi, gamma, abundance, fe_abundance = self._broadcast_batch(
+            NH, redshift, temp, xi, gamma, abundance, fe_abundance)
+
+        base_opacity = self._calc_batch_base_opacity(temp, xi, gamma,
+                                                     abundance, fe_abundance)
+
+        opacity = np.empty((len(NH), len(x)))
+        for z in np.unique(redshift):
+            rows = redshift == z
+            opacity[rows] = self._interpolate_opacity(self._get_interp_weights(x, z),
+                                                      base_opacity[rows])
+
+        return np.exp(-NH[:, np.newaxis]*opacity)
+
+    def evaluate_with_jacobian(self, x, NH, redshift, temp, xi, gamma, abundance,
+                               fe_abundance):
+        """
+        Evaluate the model together with its analytic derivatives with respect
+        to all parameters (in the units of evaluate, not the transformed values).
+        All derivatives share the ionization balance and one interpolation.
+        Always uses the numpy backend.
+
+        :param x: energies in keV
+        :returns: transmission and the jacobian with shape (n_parameters, len(x)),
+            the rows in the order of the parameters
+        """
+        base_opacity = self._calc_base_opacity_jacobian(temp, xi, gamma,
+                                                        abundance, fe_abundance)
+
+        weights = self._get_interp_weights(x, redshift)
+        opacity = self._interpolate_opacity(weights, base_opacity)
+
+        res = np.exp(-NH*opacity[0])
+
+        jac = np.empty((7, len(x)))
+        jac[0] = -opacity[0]*res
+        jac[1] = self._interpolate_opacity_slope(weights, base_opacity[0],
+                                                 x*(1+redshift))/(1+redshift)
+        jac[2:] = opacity[1:]
+        jac[1:] *= -NH*res
+
+        return res, jac
+
+    def _calc_base_opacity_jacobian(self, temp, xi, gamma, abundance, fe_abundance):
+        """
+        Calculate the opacity at the base energies and its derivatives with respect
+        to temp, xi, gamma, abundance and fe_abundance (shape (6, n_base_energies)).
+        """
+        num, dnum = self._calc_num_jacobian(temp, xi, gamma)
+
+        ab = self._calc_abundance(abundance, fe_abundance)[self._ion_element]
+        group = self._abundance_group[self._ion_element]
+
+        weights = np.empty((6, self._n_ions))
+        weights[0] = num*ab
+        weights[1:4] = dnum*ab
+        # the abundances are log10 of the scale of their group
+        weights[4] = np.log(10)*weights[0]*(group == 1)
+        weights[5] = np.log(10)*weights[0]*(group == 2)
+
+        return np.dot(weights, self._table_sigma.T)*6.6e-5
 
-    # @cache_array_method(maxsize=1)
-    def _calc_opacity(self, e, temp, xi, gamma, abundance, fe_abundance):
+    @staticmethod
+    def _broadcast_batch(*params):
+        """
+        Broadcast the parameters of a batch to arrays with shape (P,)
+        """
+        return np.broadcast_arrays(*(np.atleast_1d(np.asarray(p, dtype=float))
+                                     for p in params))
+
+    def _calc_batch_base_opacity(self, temp, xi, gamma, abundance, fe_abundance):
+        """
+        Calculate the opacity at the base energies for a batch of parameter sets
+        (shape (P, n_base_energies))
+        """
+        num = self._calc_num(temp, xi, gamma)
+
+        # weight num by abundance
+        num = num*self._calc_abundance(abundance, fe_abundance)[..., self._ion_element]
+
+        # multiply together and sum over all ions
+        return np.dot(num.astype(self._dtype), self._sigma_dtype.T)*6.6e-5
+
+    def _evaluate_chunked(self, chunks, x, NH, redshift, temp, xi, gamma,
+                          abundance, fe_abundance):
+        """
+        Evaluate the model chunk by chunk, so the temporary arrays never exceed
+        the memory budget.
+        """
+        group_abundance, scale = self._split_abundance(abundance, fe_abundance)
+
+        base_opacity = np.dot(scale, self._calc_partial_base_opacity(temp, xi, gamma,
+                                                                     *group_abundance))
+
+        res = np.empty(len(x))
+        for chunk in chunks:
+            weights = self._calc_interp_weights(x[chunk]*(1+redshift))
+            opacity = self._interpolate_opacity(weights, base_opacity)
+            np.exp(-NH*opacity, out=res[chunk])
+
+        return res
+
+    def _use_design_matrix(self, x):
+        """
+        Check if the precompiled design matrix should be used. This is the case
+        if the redshift is fixed (so the energies never change) and the grid is
+        smaller than the sigma table, otherwise contracting with the sigma
+        table first is cheaper.
+        The auto backend can overrule the grid size check.
+        Drops the design matrix if the redshift is not fixed anymore.
+        """
+        if not self.redshift.fix:
+            self._design_matrix = None
+            return False
+
+        if self._design_matrix_mode is not None:
+            return self._design_matrix_mode
+
+        return len(x) <= len(self._table_energy)
+
+    def _get_design_matrix(self, x, redshift):
+        """
+        Get the matrix with the interpolated sigma (times 6.6e-5) of all ions
+        for the energies x*(1+redshift). Rebuilt if the grid or redshift changes.
+        """
+        key = (array_fingerprint(x), redshift)
+
+        if self._design_matrix is None or self._design_matrix[0] != key:
+            design_matrix = (self._interpolate_sigma(x*(1+redshift)) *
+                             6.6e-5).astype(self._dtype)
+            design_matrix.flags.writeable = False
+            self._design_matrix = (key, design_matrix)
+
+        return self._design_matrix[1]
+
+    def _calc_opacity(self, x, redshift, temp, xi, gamma, abundance, fe_abundance):
         """
         Calculate the opacity for the given parameters and energies
         """
+        group_abundance, scale = self._split_abundance(abundance, fe_abundance)
 
-        # calc the ionizing spectrum
-        spec = self._calc_ion_spec(gamma)
+        return np.dot(scale, self._calc_partial_opacity(x, redshift, temp, xi, gamma,
+                                                        *group_abundance))
+
+    def _split_abundance(self, abundance, fe_abundance):
+        """
+        If one of the abundances is free, the opacity is split in the three
+        abundance groups (H+He, elements>He, Fe) for the base abundance, and the
+        groups are only scaled by the abundances. Then a change of the abundances
+        does not need a new ionization balance or interpolation.
+        Otherwise there is only one group with the given abundances.
+        Returns the abundances for the partial stages and the scale of the groups.
+        """
+        if self.abundance.free or self.fe_abundance.free:
+            return (None, None), np.array([1.0, 10**abundance, 10**fe_abundance],
+                                          dtype=self._dtype)
+
+        return (abundance, fe_abundance), np.ones(1, dtype=self._dtype)
+
+    @cache_stage("partial_opacity")
+    def _calc_partial_opacity(self, x, redshift, temp, xi, gamma, abundance, fe_abundance):
+        """
+        Calculate the opacity of the abundance groups for the given
+        energies (shape (n_groups, len(x))).
+        """
+        if self._use_design_matrix(x):
+            # the design matrix times the weighted num
+            return np.dot(self._calc_partial_ion_weights(temp, xi, gamma,
+                                                         abundance, fe_abundance
+                                                         ).astype(self._dtype),
+                          self._get_design_matrix(x, redshift).T)
+
+        return self._interpolate_opacity(self._get_interp_weights(x, redshift),
+                                         self._calc_partial_base_opacity(temp, xi, gamma,
+                                                                         abundance, fe_abundance))
+
+    @cache_stage("partial_base_opacity")
+    def _calc_partial_base_opacity(self, temp, xi, gamma, abundance, fe_abundance):
+        """
+        Calculate the opacity of the abundance groups at the base energies
+        (shape (n_groups, n_base_energies)). The interpolation of sigma is linear
+        in sigma, so we can contract num with the sigma table first and only
+        interpolate these curves afterwards.
+        """
+        num = self._calc_partial_ion_weights(temp, xi, gamma, abundance, fe_abundance)
 
+        # multiply together and sum over all ions
+        return np.dot(num.astype(self._dtype), self._sigma_dtype.T)*6.6e-5
+
+    @cache_stage("partial_ion_weights")
+    def _calc_partial_ion_weights(self, temp, xi, gamma, abundance, fe_abundance):
+        """
+        Calc the num vector weighted by the abundance of the elements
+        (shape (n_groups, n_ions)). Split in the three abundance groups with
+        the base abundance if abundance and fe_abundance are None.
+        """
         # get the num matrix
-        num = self._calc_num(spec, temp, xi)
+        num = self._calc_num(temp, xi, gamma)
 
-        # get abundance TODO check this
-        ab = np.copy(self._abundance)
-        ab[2:-1] *= 10**abundance  # for elements>He
-        ab[-1] *= 10**fe_abundance  # for iron
+        if abundance is None:
+            weights = np.zeros((3, self._n_ions))
+            weights[self._abundance_group[self._ion_element],
+                    np.arange(self._n_ions)] = num*self._abundance[self._ion_element]
+
+            return weights
+
+        ab = self._calc_abundance(abundance, fe_abundance)
 
         # weight num by abundance
-        num *= ab
-        # interpolate sigma for the given e values
-        sigma = self._interpolate_sigma(e)
+        return (num*ab[self._ion_element])[np.newaxis]
 
-        # multiply together and sum
-        return np.sum(num*sigma, axis=(1, 2))*6.6e-5
+    def _calc_abundance(self, abundance, fe_abundance):
+        """
+        Abundance of all elements in the model. abundance and fe_abundance
+        can also be arrays, then the result has the elements in the last axis.
+        """
+        # get abundance TODO check this
+        ab = np.multiply.outer(np.ones(np.shape(abundance)), self._abundance)
+        ab[..., 2:-1] *= 10**np.asarray(abundance)[..., np.newaxis]  # for elements>He
+        ab[..., -1] *= 10**np.asarray(fe_abundance)  # for iron
 
-    # @cache_array_method(maxsize=1)
-    def _interpolate_sigma(self, ekev):
+        return ab
+
+    @cache_stage("interp_weights", maxsize=8)
+    def _get_interp_weights(self, x, redshift):
+        """
+        Get the interpolation weights for the energies x*(1+redshift).
+        Cached with the fingerprint of x as key, because x is the same
+        array in most calls during a fit.
         """
-        Interpolate sigma for the e values
+        return self._calc_interp_weights(x*(1+redshift))
+
+    def _calc_interp_weights(self, ekev):
+        """
+        Calc the bracketing indices in the energies of the sigma table and the
+        linear weights for the e values, plus the indices and factors of the
+        e values that have to be extrapolated above the grid.
         """
         e = 1000*ekev
 
-        sigma = np.zeros((len(e), self._sigma.shape[1], self._sigma.shape[2]))
+        idx = self._table_segment[self._find_bins(e)]
+
+        # clipping the weight gives the value at the edges of the
+        # base energy for e outside of the grid
+        energy = self._table_energy
+        w = (e-energy[idx])/(energy[idx+1]-energy[idx])
+        w = np.clip(w, 0, 1).astype(self._dtype)
+
+        # for e>max(base_energy) extend with a powerlaw with slope -3
+        ext_idx = np.nonzero(e > self._base_energy[-1])[0]
+        ext_factor = np.power(e[ext_idx]/self._base_energy[-1], -3.0).astype(self._dtype)
+
+        for arr in (idx, w, ext_idx, ext_factor):
+            arr.flags.writeable = False
+
+        return idx, w, ext_idx, ext_factor
+
+    def _find_bins(self, e):
+        """
+        Index of the base energy bin of every e value (base_energy[idx] <= e <
+        base_energy[idx+1]), clipped to the first and last bin.
+        """
+        n = len(self._base_energy)
+
+        if self._log_grid is None:
+            idx = np.searchsorted(self._base_energy, e, side="right")-1
+            return np.clip(idx, 0, n-2)
+
+        log_e0, inv_dlog = self._log_grid
+
+        # e inside of the grid, so the index is never negative and
+        # astype does the floor
+        e = np.clip(e, self._base_energy[0], self._base_energy[-1])
+        idx = ((np.log(e)-log_e0)*inv_dlog).astype(np.intp)
+        np.clip(idx, 0, n-2, out=idx)
 
-        # we have to split in three parts. e>max(base_energy)
-        # and e<min(base_energy) and rest
-        mask1 = e > self._base_energy[-1]
-        mask2 = e < self._base_energy[0]
+        # correct the rounding of the grid by one bin
+        idx -= e < self._base_energy[idx]
+        idx += e >= self._base_energy[idx+1]
 
-        mask3 = (~mask1)*(~mask2)
-        # for mask true use simple interpolation between
-        # the base energy values
+        return np.clip(idx, 0, n-2, out=idx)
 
-        sigma[mask3] = self._interp_sigma(e[mask3])
+    def _interpolate_opacity(self, weights, base_opacity):
+        """
+        Interpolate the opacity at the base energies (last axis of base_opacity)
+        with the given interpolation weights.
+        Uses the same extrapolation as _interpolate_sigma.
+        """
+        idx, w, ext_idx, ext_factor = weights
+
+        opacity = np.take(base_opacity, idx, axis=-1)
+        opacity += w*np.take(np.diff(base_opacity, axis=-1), idx, axis=-1)
+        opacity[..., ext_idx] *= ext_factor
+
+        return opacity
+
+    def _interpolate_opacity_slope(self, weights, base_opacity, ekev):
+        """
+        Derivative of the interpolated opacity with respect to log(e)
+        """
+        idx, w, ext_idx, ext_factor = weights
+
+        e = 1000*ekev
 
-        # for mask false extend the sigma at the highest energy base value with
-        # a powerlaw with slope -3
+        # constant below the grid
+        dlog_e = e/np.diff(self._table_energy)[idx]
+        dlog_e[e < self._base_energy[0]] = 0
 
-        sigma[mask1] = self._sigma[720]
-        sigma[mask1] *= np.expand_dims(np.power((e[mask1] /
-                                                 self._base_energy[-1]), -3.0), axis=(1, 2))
+        slope = np.take(np.diff(base_opacity, axis=-1), idx, axis=-1)*dlog_e
+        slope[..., ext_idx] = -3.0*base_opacity[..., -1:]*ext_factor
+
+        return slope
+
+    def _interpolate_sigma(self, ekev):
+        """
+        Interpolate sigma of all ions for the e values. The bins and weights
+        are shared by all ions. Below the base energies the clipped weights
+        give sigma at the lowest energy, above it is extended with a powerlaw
+        with slope -3.
+        """
+        idx, w, ext_idx, ext_factor = self._calc_interp_weights(ekev)
 
-        sigma[mask2] = self._sigma[0]
+        sigma = self._table_sigma[idx]
+        sigma += w[:, np.newaxis]*(self._table_sigma[idx+1]-sigma)
+        sigma[ext_idx] *= ext_factor[:, np.newaxis]
 
         return sigma
 
-    @lru_cache(maxsize=1)
+    @cache_stage("ion_spec")
     def _calc_ion_spec(self, gamma):
         """
-        Calc the F(E)*deltaE at the grid energies of the base energies.
+        Calc the F(E)*deltaE at the grid energies of the base energies,
+        normalized. gamma can be an array, then the spectra are along the last
+        axis. Plain numpy (only the base energies), so the numpy backend never
+        compiles the numba kernels.
         """
-        return calc_ion_spec_numba(gamma, self._base_energy, self._deltaE)
+        gamma = np.asarray(gamma, dtype=float)[..., np.newaxis]
+
+        F = self._base_energy**-gamma*self._base_energy
+        return (F*self._deltaE/np.sum(F*self._deltaE, axis=-1, keepdims=True) /
+                self._base_energy)
 
-    # @cache_array_method(maxsize=1)
-    def _calc_num(self, spec, temp, xi):
+    @cache_stage("photo_integral")
+    def _calc_photo_integral(self, gamma):
         """
-        Calc the num matrix. I don't really understand most of this. I copied the code
-        from xspec and vectrorized most of the calc for speed. Tested to give the same result
-        like xspec.
+        Calc the photoionization integral of every ion for the ionizing spectrum
         """
-        # transform temp to units of 10**4 K
-        t4 = 0.0001*temp
-        tfact = 1.033E-3/np.sqrt(t4)
+        # calc the ionizing spectrum
+        spec = self._calc_ion_spec(gamma)
 
-        # log of xi
-        if xi <= 0:
-            xil = -100.0
-        else:
-            xil = np.log(xi)
+        return np.dot(spec, self._sigma)
 
-        num = np.zeros((self._max_atomicnumber,
-                        len(self._atomicnumber)))
+    @cache_stage("recombination")
+    def _calc_recombination(self, temp):
+        """
+        Calc the recombination rate of every ion
+        """
+        # transform temp to units of 10**4 K
+        t4 = 0.0001*np.asarray(temp, dtype=float)[..., np.newaxis]
+        tfact = 1.033E-3/np.sqrt(t4)
 
         # loop over all types of atoms in the model
-        e1 = np.exp(-self._ion[:, :, 4]/t4)
-        e2 = np.exp(-self._ion[:, :, 6]/t4)
-        arec = (self._ion[:, :, 1]*np.power(t4, -self._ion[:, :, 2]) +
-                self._ion[:, :, 3]*np.power(t4, -1.5) *
-                e1*(1.0+self._ion[:, :, 5]*e2))
+        e1 = np.exp(-self._ion[:, 4]/t4)
+        e2 = np.exp(-self._ion[:, 6]/t4)
+        arec = (self._ion[:, 1]*np.power(t4, -self._ion[:, 2]) +
+                self._ion[:, 3]*np.power(t4, -1.5) *
+                e1*(1.0+self._ion[:, 5]*e2))
         z2 = self._atomicnumber**2
         y = 15.8*z2/t4
         arec2 = tfact*z2*(1.735+np.log(y)+1/(6.*y))
-        arec[self._mask_2] = arec2
+        arec[..., self._mask_2] = arec2
+
+        return arec
+
+    def _calc_dlog_recombination(self, temp):
+        """
+        Calc the derivative of the log of the recombination rate of every ion
+        with respect to temp
+        """
+        t4 = 0.0001*temp
+
+        e1 = np.exp(-self._ion[:, 4]/t4)
+        e2 = np.exp(-self._ion[:, 6]/t4)
+        rad = self._ion[:, 1]*np.power(t4, -self._ion[:, 2])
+        diel = self._ion[:, 3]*np.power(t4, -1.5)*e1
+        darec = (-self._ion[:, 2]*rad +
+                 diel*((1.0+self._ion[:, 5]*e2)*(self._ion[:, 4]/t4-1.5) +
+                       self._ion[:, 5]*e2*self._ion[:, 6]/t4))/t4
+
+        arec = self._calc_recombination(temp)
+
+        dlog = np.zeros(self._n_ions)
+        dlog[arec != 0] = darec[arec != 0]/arec[arec != 0]
+
+        z2 = self._atomicnumber**2
+        y = 15.8*z2/t4
+        dlog[self._mask_2] = -(0.5+(1-1/(6.*y))/(1.735+np.log(y)+1/(6.*y)))/t4
+
+        # t4 is in units of 10**4 K
+        return 0.0001*dlog
+
+    def _calc_dlog_photo_integral(self, gamma):
+        """
+        Calc the derivative of the log of the photoionization integral of every ion
+        with respect to gamma
+        """
+        spec = self._calc_ion_spec(gamma)
+
+        # the spectrum is normalized, so only the shape changes with gamma
+        log_e = np.log(self._base_energy)
+        dspec = spec*(np.sum(spec*self._base_energy*log_e)-log_e)
+
+        intgral = self._calc_photo_integral(gamma)
+
+        dlog = np.zeros(self._n_ions)
+        dlog[intgral != 0] = np.dot(dspec, self._sigma)[intgral != 0]/intgral[intgral != 0]
+
+        return dlog
+
+    def _calc_num_jacobian(self, temp, xi, gamma):
+        """
+        Calc the num vector and its derivatives with respect to temp, xi and gamma
+        (shape (3, n_ions)). log(num) of a stage is the unnormalized log of the
+        stage (ratios of the lower stages plus stage*log(xi)) minus the log of the
+        sum over all stages of the element, including the fully stripped one. So
+        its derivative is the derivative of the unnormalized log minus the mean
+        of these derivatives over all stages.
+        """
+        num = self._calc_num(temp, xi, gamma)
+        arec = self._calc_recombination(temp)
+
+        # derivatives of the ratios and of log(xi)
+        dratio = np.zeros((3, self._n_ions))
+        dratio[0] = -self._calc_dlog_recombination(temp)
+        dratio[2] = self._calc_dlog_photo_integral(gamma)
+        dratio[:, arec == 0] = 0
+        dxil = np.zeros((3, 1))
+        if xi > 0:
+            dxil[1] = 1/xi
+
+        # cumsum of dratio within every element
+        dcumsum = np.cumsum(dratio, axis=-1)
+        dcumsum -= (dcumsum-dratio)[:, self._element_start][:, self._ion_element]
+
+        dmul = dcumsum + (self._ion_stage+1)*dxil
+        dlog = dmul-dratio-dxil
+
+        # the fully stripped stage has the mul of the last ion
+        stripped = 1-np.add.reduceat(num, self._element_start)
+        mean = (np.add.reduceat(num*dlog, self._element_start, axis=-1) +
+                stripped*dmul[:, self._mask_2])
+
+        return num, num*(dlog-mean[:, self._ion_element])
+
+    @cache_stage("num")
+    def _calc_num(self, temp, xi, gamma):
+        """
+        Calc the num vector (packed, one entry per ion). I don't really understand most
+        of this. I copied the code from xspec and vectrorized most of the calc for speed.
+        Tested to give the same result like xspec.
+        temp, xi and gamma can also be arrays, then the result has the ions in the last
+        axis.
+        """
+        return self._solve_balance(self._calc_recombination(temp),
+                                   self._calc_photo_integral(gamma), xi)
+
+    def _solve_balance(self, arec, intgral, xi):
+        """
+        Solve the ionization balance for given recombination rates and
+        photoionization integrals (ions in the last axis) and xi.
+        """
+        # log of xi
+        xi = np.asarray(xi, dtype=float)[..., np.newaxis]
+        xil = np.full_like(xi, -100.0)
+        np.log(xi, out=xil, where=xi > 0)
+
+        arec, intgral = np.broadcast_arrays(arec, intgral)
 
-        intgral = np.sum(self._sigma.T*spec, axis=2)
+        ratio = np.zeros(arec.shape)
 
-        ratio = np.zeros_like(arec)
+        # difference of the logs, so tiny rates can not overflow the quotient
+        ratio[arec != 0] = (np.log(3.2749e-6*intgral[arec != 0]) -
+                            np.log(arec[arec != 0]))
 
-        ratio[arec != 0] = np.log(3.2749e-6*intgral[arec != 0]/arec[arec != 0])
-        #ratio = np.log(3.2749e-6*intgral/arec)
-        #ratio[arec == 0] = 0
-        ratcumsum = np.cumsum(ratio, axis=1)
+        # cumsum of ratio within every element
+        ratcumsum = np.cumsum(ratio, axis=-1)
+        ratcumsum -= (ratcumsum-ratio)[..., self._element_start][..., self._ion_element]
 
-        mul = ratcumsum + (np.arange(1, self._max_atomicnumber+1))*xil
-        mul[~self._mask_valid] = -10**99
-        mult = np.max(mul, axis=1)
-        mul = (mul.T-mult).T
-        emul = np.exp(mul)
-        emul[~self._mask_valid] = 0
+        mul = ratcumsum + (self._ion_stage+1)*xil
+        # log-sum-exp over all stages of an element. The max includes the
+        # neutral atom (mul=0), so all exponents are <= 0 and nothing can
+        # overflow, also in single precision.
+        mult = np.maximum(np.maximum.reduceat(mul, self._element_start, axis=-1), 0)
+        emul = np.exp(mul-mult[..., self._ion_element])
 
-        s = np.sum(emul, axis=1)
+        s = np.add.reduceat(emul, self._element_start, axis=-1)
 
         s += np.exp(-mult)
-        num[0] = -mult-np.log(s)
-        for j in range(1, 26):
-            num[j] = num[j-1]+ratio[:, j-1]+xil
+
+        # num of ion j is given by mul of ion j-1 (0 for the neutral atom)
+        num = mul-ratio-xil
+        num -= (mult+np.log(s))[..., self._ion_element]
 
         num = np.exp(num)
-        num[~self._mask_valid.T] = 0
         return num
 
+    def ionization_fractions(self, temp, xi, gamma, chunk_size=10000):
+        """
+        Ion fractions of all elements for arrays of temperatures (in K), ionization
+        parameters and photon indices, which are broadcast against each other
+        (e.g. a meshgrid for ionization-fraction maps).
+        The grid is solved in chunks of chunk_size points. Within a chunk the
+        recombination rates and photoionization integrals are computed only once
+        per unique temperature and photon index.
+
+        :param temp: temperature in K
+        :param xi: ionization parameter
+        :param gamma: photon index of the ionizing spectrum
+        :param chunk_size: number of grid points solved at once
+        :returns: ion fractions with shape broadcast_shape+(max_atomicnumber, n_elements).
+            Entry [..., j, i] is the fraction of element i (ordered like the
+            abundances) in ionization stage j (0 for the neutral atom). The fully
+            stripped ion is not included and entries above the atomic number are 0.
+        """
+        assert chunk_size >= 1, f"{chunk_size} not a valid chunk_size"
+
+        temp, xi, gamma = np.broadcast_arrays(*(np.asarray(p, dtype=float)
+                                                for p in (temp, xi, gamma)))
+        shape = temp.shape
+        temp, xi, gamma = temp.ravel(), xi.ravel(), gamma.ravel()
+
+        num = np.empty((temp.size, self._n_ions))
+        for start in range(0, temp.size, chunk_size):
+            chunk = slice(start, start+chunk_size)
+            utemp, itemp = np.unique(temp[chunk], return_inverse=True)
+            ugamma, igamma = np.unique(gamma[chunk], return_inverse=True)
+
+            # shared terms, gathered for every point of the chunk
+            arec = self._calc_recombination(utemp)[itemp]
+            intgral = self._calc_photo_integral(ugamma)[igamma]
+
+            num[chunk] = self._solve_balance(arec, intgral, xi[chunk])
+
+        fractions = np.zeros((temp.size, self._max_atomicnumber,
+                              len(self._atomicnumber)))
+        fractions[:, self._ion_stage, self._ion_element] = num
+
+        return fractions.reshape(shape+fractions.shape[1:])
+
 
 
 class Integrate_Absori(Absori, metaclass=FunctionMeta):
@@ -429,6 +1538,11 @@ class Integrate_Absori(Absori, metaclass=FunctionMeta):
 
     """
 
+    # strategies of the auto backend. The shells are summed over the
+    # interpolated base opacity, there is no design matrix
+    _auto_strategies = {"numpy": ("numpy", False),
+                        "numba": ("numba", None)}
+
     def _setup(self):
         super(Integrate_Absori, self)._setup()
         self._omegam = 0.3
@@ -448,36 +1562,215 @@ class Integrate_Absori(Absori, metaclass=FunctionMeta):
         self.fe_abundance.unit = astropy_units.dimensionless_unscaled
 
     def evaluate(self, x, n0, delta, redshift, temp, xi, gamma, abundance, fe_abundance):
+        backend = self._select_backend(x, (n0, delta, redshift, temp, xi, gamma,
+                                           abundance, fe_abundance))
 
-        # define z shells
-        nz = int(redshift/0.02)
-        zsam = redshift/nz
-        zz = zsam*0.5
-        spec = self._calc_ion_spec(gamma)
-        num = self._calc_num(spec, temp, xi)
+        if backend == "numba":
+            from bb_astromodels.utils.numba_functions import (
+                calc_base_opacity_numba, calc_num_numba, integrate_absori_numba)
 
-        # get abundance TODO check this
-        ab = np.copy(self._abundance)
-        ab[2:-1] *= 10**abundance  # for elements>He
-        ab[-1] *= 10**fe_abundance  # for iron
+            z1, zf = self._calc_shells(n0, delta, redshift)
 
-        # weight num by abundance
-        num *= ab
+            spec = self._calc_ion_spec(gamma)
+            num = calc_num_numba(spec, temp, xi, self._ion, self._sigma,
+                                 self._element_start, self._atomicnumber)
+            base_opacity = calc_base_opacity_numba(
+                num, self._calc_abundance(abundance, fe_abundance),
+                self._sigma, self._ion_element)
+
+            return integrate_absori_numba(np.ascontiguousarray(x, dtype=float), z1, zf,
+                                          self._base_energy, base_opacity)
+
+        if backend == "jax":
+            jax_functions = _import_jax_functions()
+
+            with jax_functions.enable_x64():
+                return np.asarray(jax_functions.integrate_absori_jax(
+                    x, n0, delta, redshift, temp, xi, gamma, abundance, fe_abundance,
+                    self._get_jax_data(), nz=int(redshift/0.02)))
+
+        group_abundance, scale = self._split_abundance(abundance, fe_abundance)
+
+        chunks = self._chunks(len(x))
+        if chunks is not None:
+            z1, zf = self._calc_shells(n0, delta, redshift)
+            base_opacity = np.dot(scale, self._calc_partial_base_opacity(
+                temp, xi, gamma, *group_abundance))
+
+            res = np.empty(len(x))
+            for chunk in chunks:
+                np.exp(-self._sum_shells(x[chunk], z1, zf, base_opacity), out=res[chunk])
+
+            return res
+
+        # taus are linear in n0 and in the abundance scales, float64 like in
+        # Absori.evaluate
+        taus = np.multiply(n0, np.dot(scale, self._calc_partial_taus(
+            x, delta, redshift, temp, xi, gamma, *group_abundance)), dtype=float)
+
+        return np.exp(-taus)
 
+    def _jax_constants(self):
+
+        return dict(omegam=self._omegam, omegal=self._omegal, h0=self._h0,
+                    cmpermpc=self._cmpermpc, c=self._c)
+
+    def get_jax_function(self, nz=None):
+        """
+        Get the model as a pure jax function f(x, *parameter_values) with the
+        parameter values in the order and units of evaluate. It can be
+        jit-compiled, vmapped over parameter batches and differentiated
+        with jax.grad. The number of redshift shells has to be static in jax,
+        by default it is the one of the current redshift value.
+        The function runs in the precision of the surrounding jax code like in
+        Absori.get_jax_function.
+
+        :param nz: number of redshift shells
+        """
+        jax_functions = _import_jax_functions()
+
+        if nz is None:
+            nz = int(self.redshift.value/0.02)
+
+        def integrate_absori(x, n0, delta, redshift, temp, xi, gamma, abundance,
+                             fe_abundance):
+            return jax_functions.integrate_absori_jax(x, n0, delta, redshift, temp, xi,
+                                                      gamma, abundance, fe_abundance,
+                                                      self._get_jax_data(), nz=nz)
+
+        return integrate_absori
+
+    def _calc_breakpoints(self, values):
+        """
+        Observed energies (keV) where the bins are split. The shells smear every
+        edge between its energy in the first and in the last shell, so the
+        breakpoints of these two shells are used.
+        """
+        redshift = values[list(self.parameters).index("redshift")]
+
+        return np.union1d(self._breakpoint_energies/1000,
+                          self._breakpoint_energies/(1000*(1+redshift)))
+
+    def evaluate_batch(self, x, n0, delta, redshift, temp, xi, gamma, abundance,
+                       fe_abundance):
+        """
+        Evaluate the model for P parameter sets at once, e.g. for the samples of a
+        sampler or a posterior predictive check. The parameters are arrays with
+        shape (P,) (scalars are used for all sets) in the units of evaluate.
+        The ionization balance is solved for all sets in one pass.
+        Always uses the numpy backend.
+
+        :param x: energies in keV
+        :returns: transmission with shape (P, len(x))
+        """
+        n0, delta, redshift, temp, xi, gamma, abundance, fe_abundance = self._broadcast_batch(
+            n0, delta, redshift, temp, xi, gamma, abundance, fe_abundance)
+
+        base_opacity = self._calc_batch_base_opacity(temp, xi, gamma,
+                                                     abundance, fe_abundance)
+
+        # the shells only depend on delta and redshift
+        taus = np.empty((len(n0), len(x)))
+        for d, z in np.unique(np.stack([delta, redshift], axis=-1), axis=0):
+            rows = (delta == d) & (redshift == z)
+            z1, zf = self._calc_shells(1.0, d, z)
+            taus[rows] = self._sum_shells(x, z1, zf, base_opacity[rows])
+
+        return np.exp(-n0[:, np.newaxis]*taus)
+
+    def evaluate_with_jacobian(self, x, n0, delta, redshift, temp, xi, gamma,
+                               abundance, fe_abundance):
+        """
+        Evaluate the model together with its analytic derivatives with respect
+        to all parameters (in the units of evaluate, not the transformed values).
+        The redshift derivative is taken at a fixed number of redshift shells.
+        All derivatives share the ionization balance and the shell loop.
+        Always uses the numpy backend.
+
+        :param x: energies in keV
+        :returns: transmission and the jacobian with shape (n_parameters, len(x)),
+            the rows in the order of the parameters
+        """
+        base_opacity = self._calc_base_opacity_jacobian(temp, xi, gamma,
+                                                        abundance, fe_abundance)
+
+        z1, zf = self._calc_shells(1.0, delta, redshift)
+
+        # derivatives of the log of the shell weights
+        dlogzf_delta = np.log(z1)
+        dz1 = (z1-1)/redshift
+        dlogzf_z = (1/redshift + dz1*((delta+2)/z1 - 1.5*self._omegam*z1**2 /
+                                      (self._omegam*z1**3+self._omegal)))
+
+        # rows: taus, delta, redshift, temp, xi, gamma, abundance, fe_abundance
+        taus = np.zeros((8, len(x)))
+        for i in range(len(z1)):
+            weights = self._calc_interp_weights(x*z1[i])
+            # factor 1*e-22
+            xsec = self._interpolate_opacity(weights, base_opacity)*1e-22
+            slope = self._interpolate_opacity_slope(weights, base_opacity[0],
+                                                    x*z1[i])*1e-22
+
+            taus[0] += xsec[0]*zf[i]
+            taus[1] += xsec[0]*zf[i]*dlogzf_delta[i]
+            taus[2] += (xsec[0]*dlogzf_z[i]+slope*dz1[i]/z1[i])*zf[i]
+            taus[3:] += xsec[1:]*zf[i]
+
+        res = np.exp(-n0*taus[0])
+
+        jac = np.empty((8, len(x)))
+        jac[0] = -taus[0]*res
+        jac[1:] = -n0*taus[1:]*res
+
+        return res, jac
+
+    @cache_stage("partial_taus")
+    def _calc_partial_taus(self, x, delta, redshift, temp, xi, gamma,
+                           abundance, fe_abundance):
+        """
+        Calc the taus of the abundance groups for n0=1
+        """
+        z1, zf = self._calc_shells(1.0, delta, redshift)
+
+        partial_base_opacity = self._calc_partial_base_opacity(temp, xi, gamma,
+                                                               abundance, fe_abundance)
+
+        return self._sum_shells(x, z1, zf, partial_base_opacity)
+
+    def _sum_shells(self, x, z1, zf, base_opacity):
+        """
+        Sum the taus of all redshift shells
+        """
         # array with the taus for alle energies
-        taus = np.zeros(len(x))
+        taus = np.zeros(base_opacity.shape[:-1]+(len(x),), dtype=base_opacity.dtype)
+        zf = zf.astype(base_opacity.dtype)
 
+        for i in range(len(z1)):
+            # factor 1*e-22
+            xsec = self._interpolate_opacity(self._calc_interp_weights(x*z1[i]),
+                                             base_opacity)*1e-22
+            taus += xsec*zf[i]
+
+        return taus
+
+    def _calc_shells(self, n0, delta, redshift):
+        """
+        Calc 1+z and the weight (n*dl) of all redshift shells
+        """
+        # define z shells
+        nz = int(redshift/0.02)
+        zsam = redshift/nz
+        zz = zsam*0.5
+
+        z1 = np.zeros(nz)
+        zf = np.zeros(nz)
         for i in range(nz):
-            z1 = zz+1.0
+            z1[i] = zz+1.0
             # n in this shell
-            n = n0*z1**delta
-            zf = (z1**2/np.sqrt(self._omegam*z1**3+self._omegal))
-            zf *= zsam*self._c*n*self._cmpermpc/self._h0
+            n = n0*z1[i]**delta
+            zf[i] = (z1[i]**2/np.sqrt(self._omegam*z1[i]**3+self._omegal))
+            zf[i] *= zsam*self._c*n*self._cmpermpc/self._h0
 
-            sigma = self._interpolate_sigma(x*z1)
-            # factor 1*e-22
-            xsec = np.sum(num*sigma, axis=(1, 2))*6.6e-5*1e-22
-            taus += xsec*zf
             zz += zsam
 
-        return np.exp(-taus)
+        return z1, zf
@@ -0,0 +1,66 @@
+"""
+Time per likelihood step of the unit-free fast path (fast_evaluate with a
+flat parameter vector) compared to the normal astromodels __call__, where
+the parameters are set on the model before every call.
+
+Two cases: every step changes temp (the ionization balance is rerun) and no
+parameter of the model changes (e.g. only an other component of the fit
+changed, the cached result is reused, so the call overhead dominates).
+
+Run with: python benchmarks/fast_path.py
+"""
+import timeit
+
+import numpy as np
+
+from bb_astromodels import Absori, Integrate_Absori
+
+
+def bench_call(model, x, temps):
+    def run():
+        for t in temps:
+            model.temp.value = t
+            model(x)
+
+    return min(timeit.repeat(run, number=1, repeat=5))/len(temps)
+
+
+def bench_fast(model, x, temps):
+    values = model.get_parameter_vector()
+    i_temp = list(model.parameters).index("temp")
+
+    def run():
+        for t in temps:
+            values[i_temp] = t
+            model.fast_evaluate(x, values)
+
+    return min(timeit.repeat(run, number=1, repeat=5))/len(temps)
+
+
+def main():
+    cases = {"temp changes": np.geomspace(1e4, 1e6, 50),
+             "no change": np.full(50, 1e5)}
+
+    print(f"{'model':<18}{'case':<14}{'n_energies':>12}{'__call__ [us]':>16}"
+          f"{'fast [us]':>12}{'speedup':>10}")
+    for model_class in (Absori, Integrate_Absori):
+        model = model_class()
+        if model_class is Integrate_Absori:
+            model.redshift.value = 0.5
+
+        for n in (10, 50, 128, 1000, 10000):
+            x = np.geomspace(0.1, 20, n)
+
+            # same result on both paths
+            assert np.allclose(model(x), model.fast_evaluate(x, model.get_parameter_vector()))
+
+            for case, temps in cases.items():
+                t_call = bench_call(model, x, temps)
+                t_fast = bench_fast(model, x, temps)
+
+                print(f"{model_class.__name__:<18}{case:<14}{n:>12}{1e6*t_call:>16.1f}"
+                      f"{1e6*t_fast:>12.1f}{t_call/t_fast:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
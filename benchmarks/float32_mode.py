@@ -0,0 +1,58 @@
+"""
+Accuracy and speed of the float32 mode of Absori and Integrate_Absori
+compared to the default float64 mode.
+
+Every call changes temp, so the ionization balance, the contraction with
+the sigma table and the interpolation are rerun (the typical step of a fit).
+
+Run with: python benchmarks/float32_mode.py
+"""
+import timeit
+
+import numpy as np
+
+from bb_astromodels import Absori, Integrate_Absori
+
+
+def bench(model, x, params, n_repeat=20):
+    temps = np.geomspace(1e4, 1e6, n_repeat)
+
+    def run():
+        for t in temps:
+            params["temp"] = t
+            model.evaluate(x, **params)
+
+    return min(timeit.repeat(run, number=1, repeat=5))/n_repeat
+
+
+def main():
+    models = [(Absori(), dict(NH=2., redshift=0.3, temp=3e5, xi=30., gamma=2.2,
+                              abundance=0.4, fe_abundance=-0.3)),
+              (Integrate_Absori(), dict(n0=1e-3, delta=0.5, redshift=1.03, temp=3e5,
+                                        xi=30., gamma=2.2, abundance=0.4,
+                                        fe_abundance=-0.3))]
+
+    print(f"{'model':<18}{'n_energies':>12}{'float64 [ms]':>15}{'float32 [ms]':>15}"
+          f"{'max rel err':>14}")
+    for model, params in models:
+        for n in (100, 1000, 10000, 100000):
+            x = np.geomspace(0.1, 20, n)
+
+            model.dtype = "float64"
+            ref = model.evaluate(x, **params)
+            t64 = bench(model, x, dict(params))
+
+            model.dtype = "float32"
+            res = model.evaluate(x, **params)
+            t32 = bench(model, x, dict(params))
+
+            # relative error where the transmission is not negligible
+            mask = ref > 1e-30
+            err = np.max(np.abs(res[mask]-ref[mask])/ref[mask])
+
+            print(f"{type(model).__name__:<18}{n:>12}{1e3*t64:>15.3f}{1e3*t32:>15.3f}"
+                  f"{err:>14.1e}")
+
+
+if __name__ == "__main__":
+    main()
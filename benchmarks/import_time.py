@@ -0,0 +1,67 @@
+"""
+Import time of bb_astromodels, each measured in a fresh interpreter: the
+import of astromodels (which the package import needs to register the models),
+the package import on top of an already imported astromodels and the first
+model instance (loads the atomic data bundle).
+
+Exits with 1 if the package import loads one of the deferred modules (numba
+kernels, jax, versioneer) or takes longer than --max-import-ms on top of
+astromodels, so it can guard against regressions in CI.
+
+Run with: python benchmarks/import_time.py [--max-import-ms 50]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# must not be imported by "import bb_astromodels"
+heavy_modules = ("bb_astromodels.utils.numba_functions",
+                 "bb_astromodels.utils.jax_functions", "bb_astromodels._version",
+                 "jax", "pkg_resources")
+
+# case: (setup, timed statement)
+cases = {"import astromodels": ("pass", "import astromodels"),
+         "import bb_astromodels": ("import astromodels", "import bb_astromodels"),
+         "first Absori()": ("import bb_astromodels", "bb_astromodels.Absori()")}
+
+
+def run_timed(setup, statement, repeat):
+    """
+    Median wall time of the statement after the setup in fresh interpreters,
+    and the heavy modules imported
+    """
+    code = (f"import time, sys; {setup}; t = time.perf_counter(); {statement}; "
+            f"t = time.perf_counter()-t; "
+            f"print(t, *[m for m in {heavy_modules!r} if m in sys.modules])")
+
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout.split()
+        timings.append(float(out[0]))
+
+    return statistics.median(timings), out[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-import-ms", type=float, default=50.)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':<36}{'time [ms]':>12}  heavy modules")
+    results = {}
+    for case, (setup, statement) in cases.items():
+        results[case] = run_timed(setup, statement, args.repeat)
+        print(f"{case:<36}{1000*results[case][0]:>12.1f}  {' '.join(results[case][1])}")
+
+    t_import, loaded = results["import bb_astromodels"]
+    if loaded or 1000*t_import > args.max_import_ms:
+        print(f"Regression: import bb_astromodels took {1000*t_import:.1f} ms "
+              f"(max {args.max_import_ms} ms) and loaded {loaded}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
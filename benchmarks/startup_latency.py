@@ -0,0 +1,85 @@
+"""
+Startup latency of a fresh worker process with the numba backend, with a cold
+cache (empty numba and atomic data caches, first run after an install) and a
+warm cache (every later run). Each case runs in a fresh interpreter with its
+own NUMBA_CACHE_DIR and BB_ASTROMODELS_CACHE.
+
+- warmup(): bb_astromodels.warmup() (imports, numba kernels, atomic data)
+- first call: first model call after warmup() or without it
+
+Results (1 core, numba 0.68, python 3.11; ~3.4 s of every case is the
+import of astromodels):
+
+case          warmup() [ms]  first call after warmup [ms]  first call without [ms]
+cold cache             7974                           0.6                     7493
+warm cache             3928                           0.6                     3436
+
+Before the kernels had explicit signatures and cache=True, the first call
+took ~6 s in every process (lazy compilation, no cache). With a warm cache
+the numba kernels load in ~70 ms. The default numpy backend never imports
+the numba kernels, its first call takes ~1 ms after the imports with cold
+and warm cache.
+
+Run with: python benchmarks/startup_latency.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+with_warmup = """
+import time
+t = time.perf_counter()
+import numpy as np
+import bb_astromodels
+bb_astromodels.warmup()
+t_warmup = time.perf_counter()-t
+model = bb_astromodels.Absori()
+model.backend = "numba"
+t = time.perf_counter()
+model(np.geomspace(0.1, 10, 100))
+print(t_warmup, time.perf_counter()-t)
+"""
+
+without_warmup = """
+import time
+t = time.perf_counter()
+import numpy as np
+import bb_astromodels
+model = bb_astromodels.Absori()
+model.backend = "numba"
+model(np.geomspace(0.1, 10, 100))
+print(time.perf_counter()-t)
+"""
+
+
+def run(code, cache_dir):
+    env = dict(os.environ,
+               NUMBA_CACHE_DIR=os.path.join(cache_dir, "numba"),
+               BB_ASTROMODELS_CACHE=os.path.join(cache_dir, "bb_astromodels"))
+
+    out = subprocess.run([sys.executable, "-c", code], check=True, env=env,
+                         capture_output=True, text=True).stdout
+
+    return [1000*float(t) for t in out.split()]
+
+
+def main():
+    print(f"{'case':<12}{'warmup() [ms]':>15}{'first call after warmup [ms]':>30}"
+          f"{'first call without [ms]':>25}")
+
+    results = {}
+    for code in (with_warmup, without_warmup):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # the first run fills the cache
+            results[code] = [run(code, cache_dir), run(code, cache_dir)]
+
+    for i, case in enumerate(("cold cache", "warm cache")):
+        t_warmup, t_first = results[with_warmup][i]
+        t_without, = results[without_warmup][i]
+
+        print(f"{case:<12}{t_warmup:>15.0f}{t_first:>30.1f}{t_without:>25.0f}")
+
+
+if __name__ == "__main__":
+    main()